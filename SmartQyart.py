@@ -1,28 +1,81 @@
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler, TypeHandler
 import asyncio
-import random
-import sqlite3
-import json
+import secrets
+
+import callbacks
+import config
+import import_questions
+import webhook
+from database import Database
+from deletions import DeletionQueue
+from dispatcher import KeyedApplication, KeyedDispatcher
+from duels import Duel, DuelIdAllocator, DuelRegistry
+from fanout import fan_out
+from hot_reload import QuestionReloader
+from leaderboard import Leaderboard
+from http_pool import InstrumentedRequest
+from matchmaking import MatchmakingQueue
+from profiles import Profile, ProfileCache
+from ratelimit import PRIORITY_HIGH, PRIORITY_LOW, PriorityRateLimiter
+from questions import QuestionStore
+from rank_index import RatingRankIndex
+from scheduler import Scheduler
+from write_batcher import WriteBatcher
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
 
-conn = sqlite3.connect('quiz_bot.db', check_same_thread=False)
-cursor = conn.cursor()
+db = Database(
+    'quiz_bot.db',
+    readers=config.DB_READERS,
+    journal_mode=config.DB_JOURNAL_MODE,
+    synchronous=config.DB_SYNCHRONOUS,
+    cache_size=-config.DB_CACHE_SIZE_KIB,
+    mmap_size=config.DB_MMAP_SIZE,
+    busy_timeout=config.DB_BUSY_TIMEOUT,
+    # Checkpoints run from the scheduler instead of inside commits
+    wal_autocheckpoint=0 if config.DB_CHECKPOINT_INTERVAL > 0 else None,
+)
 
-def init_db():
-    cursor.execute('''
+def create_users_table(conn):
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
             username TEXT,
-            rating INTEGER DEFAULT 1000
+            rating INTEGER DEFAULT 1000,
+            first_name TEXT
         )
     ''')
-    conn.commit()
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+    if 'first_name' not in columns:
+        conn.execute('ALTER TABLE users ADD COLUMN first_name TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_rating ON users (rating DESC)')
+
+def fetch_top_users(conn, limit):
+    return conn.execute('SELECT user_id, username, rating FROM users ORDER BY rating DESC, user_id LIMIT ?', (limit,)).fetchall()
+
+def fetch_rating_counts(conn):
+    return conn.execute('SELECT rating, COUNT(*) FROM users GROUP BY rating').fetchall()
+
+def fetch_users(conn, user_ids):
+    placeholders = ', '.join('?' * len(user_ids))
+    return conn.execute(f'SELECT user_id, username, rating FROM users WHERE user_id IN ({placeholders})', user_ids).fetchall()
+
+def init_db():
+    # Runs before the event loop starts, so it can wait for the writer
+    db.submit_write(create_users_table).result()
+    top_players.load(db.submit_read(fetch_top_users, top_players.load_limit).result())
+    rank_index.load(db.submit_read(fetch_rating_counts).result())
+
+    question_store.init_schema()
+    # Bring the question table in line with the bundled question list
+    import_questions.sync_file(question_store, 'questions_list.json')
+    question_store.refresh()
 
 def get_title(rating):
     if rating >= 2000:
@@ -36,20 +89,90 @@ def get_title(rating):
     else:
         return 'Novice'
 
-with open('questions_list.json', 'r', encoding='utf-8') as file:
-    questions_list = json.load(file)
-
-
-waiting_users = []
-active_duels = {}
+question_store = QuestionStore('quiz_bot.db', cache_size=config.QUESTION_CACHE_SIZE)
+question_reloader = QuestionReloader(question_store, 'quiz_bot.db', 'questions_list.json')
+
+
+waiting_users = MatchmakingQueue()
+active_duels = DuelRegistry()
+duel_ids = DuelIdAllocator()
+scheduler = Scheduler()
+deletions = DeletionQueue(scheduler, workers=config.DELETION_WORKERS)
+write_batcher = WriteBatcher(db, scheduler, window=config.WRITE_BATCH_WINDOW, max_ops=config.WRITE_BATCH_MAX_OPS)
+rate_limiter = PriorityRateLimiter(
+    overall_rate=config.RATE_LIMIT_OVERALL,
+    overall_burst=config.RATE_LIMIT_OVERALL_BURST,
+    chat_rate=config.RATE_LIMIT_CHAT,
+    chat_burst=config.RATE_LIMIT_CHAT_BURST,
+    max_retries=config.RATE_LIMIT_MAX_RETRIES,
+)
+http_timeouts = dict(
+    keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+    connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+    read_timeout=config.HTTP_READ_TIMEOUT,
+    write_timeout=config.HTTP_WRITE_TIMEOUT,
+    pool_timeout=config.HTTP_POOL_TIMEOUT,
+)
+send_request = InstrumentedRequest('sends', config.HTTP_POOL_SIZE, **http_timeouts)
+get_updates_request = InstrumentedRequest('getUpdates', config.GET_UPDATES_POOL_SIZE, **http_timeouts)
+# Finished duels and the Bot API calls they made, per message mode
+api_calls_per_mode = {}
+profiles = ProfileCache(max_size=config.PROFILE_CACHE_SIZE, ttl=config.PROFILE_CACHE_TTL)
+webhook_server = None
+
+def render_leaderboard(entries):
+    lines = ['🏆 Leaderboard 🏆', '']
+    lines.extend('{}. @{} - {}'.format(i, username or 'Anonymous', rating) for i, (username, rating) in enumerate(entries, start=1))
+    return '\n'.join(lines) + '\n'
+
+top_players = Leaderboard(render_leaderboard, size=10)
+rank_index = RatingRankIndex()
+dispatcher = KeyedDispatcher(config.UPDATE_CONCURRENCY)
+
+def update_key(update):
+    # Both players of a duel share a key so their answers are handled in the
+    # order they arrived; everyone else is ordered per user
+    user = getattr(update, 'effective_user', None)
+    if user is None:
+        return None
+    duel_id = active_duels.duel_id_for_user(user.id)
+    if duel_id is not None:
+        return ('duel', duel_id)
+    return ('user', user.id)
+
+async def remember_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Runs before every other handler and keeps the profile cache warm
+    user = update.effective_user
+    if user is None:
+        return
+    if profiles.put(user.id, Profile(user.username, user.first_name)):
+        write_batcher.update_profile(user.id, user.username, user.first_name)
+        top_players.rename(user.id, user.username)
+
+async def get_profile(context, user_id):
+    profile = profiles.get(user_id)
+    if profile is not None:
+        return profile
+    result = await db.fetchone('SELECT username, first_name FROM users WHERE user_id = ?', (user_id,))
+    if result and result[1]:
+        profile = Profile(*result)
+    else:
+        # Only ask Telegram when we have never seen the user's name
+        chat = await context.bot.get_chat(user_id)
+        profile = Profile(chat.username, chat.first_name)
+    profiles.put(user_id, profile)
+    return profile
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    cursor.execute('SELECT * FROM users WHERE user_id = ?', (user.id,))
-    result = cursor.fetchone()
-    if not result:
-        cursor.execute('INSERT INTO users (user_id, username) VALUES (?, ?)', (user.id, user.username))
-        conn.commit()
+    # A registration still with the batcher when the read starts may commit
+    # while it runs, unseen by it; once committed it is no longer pending
+    registering = write_batcher.is_registering(user.id)
+    result = await db.fetchone('SELECT * FROM users WHERE user_id = ?', (user.id,))
+    if not result and not registering and not write_batcher.is_registering(user.id):
+        write_batcher.register(user.id, user.username, user.first_name)
+        top_players.update(user.id, 1000, user.username)
+        rank_index.add(1000)
         await update.message.reply_text('Welcome to the Quiz Duel Bot!')
     else:
         await update.message.reply_text('Welcome back to the Quiz Duel Bot!')
@@ -59,10 +182,9 @@ async def duel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = user.id
 
     # Check if user is already in a duel
-    for duel in active_duels.values():
-        if duel['user1_id'] == user_id or duel['user2_id'] == user_id:
-            await update.message.reply_text('You are already in a duel!')
-            return
+    if active_duels.is_playing(user_id):
+        await update.message.reply_text('You are already in a duel!')
+        return
 
     # Check if user is waiting
     if user_id in waiting_users:
@@ -70,199 +192,455 @@ async def duel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if waiting_users:
-        opponent_id = waiting_users.pop(0)
+        # Pick the questions before taking an opponent out of the queue, so a
+        # failure leaves them waiting. Cache misses and sparse id ranges query
+        # SQLite, so sampling runs in a worker thread.
+        try:
+            questions = await asyncio.to_thread(question_store.sample, 3)
+        except ValueError:
+            logging.exception('Cannot sample questions for a duel')
+            await update.message.reply_text('No questions are available right now, please try again later.')
+            return
+
+    opponent_id = waiting_users.dequeue()
+    if opponent_id is not None:
         # Start a duel
-        duel_id = len(active_duels) + 1
-        duel = {
-            'user1_id': opponent_id,
-            'user2_id': user_id,
-            'current_question': 0,
-            'questions': random.sample(questions_list, 3),
-            'scores': {opponent_id: 0, user_id: 0},
-            'answered': False,
-            'attempted_users': set(),
-            'message_ids': {}
-        }
-        active_duels[duel_id] = duel
+        duel_id = duel_ids.allocate()
+        duel = Duel(duel_id, opponent_id, user_id, questions)
+        active_duels.add(duel)
+        duel.expiry = scheduler.call_later(config.DUEL_TIMEOUT, expire_duel, context, duel_id)
 
         # Notify both users
-        opponent_chat = await context.bot.get_chat(opponent_id)
+        opponent = await get_profile(context, opponent_id)
+        duel.api_calls += 2
         await context.bot.send_message(chat_id=opponent_id, text='Duel started with @{}!'.format(user.username or user.first_name))
-        await update.message.reply_text('Duel started with @{}!'.format(opponent_chat.username or opponent_chat.first_name))
+        await update.message.reply_text('Duel started with @{}!'.format(opponent.display_name))
 
         # Send first question
-        await send_question(context, duel_id)
+        async with duel.lock:
+            await send_question(context, duel_id)
     else:
-        waiting_users.append(user_id)
+        waiting_users.enqueue(user_id)
         await update.message.reply_text('Waiting for an opponent...')
 
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if waiting_users.remove(update.effective_user.id):
+        await update.message.reply_text('You left the duel queue.')
+    else:
+        await update.message.reply_text('You are not waiting for a duel.')
+
+async def duel_fan_out(duel, calls):
+    # fan_out() that also counts the Bot API calls made on behalf of the duel
+    duel.api_calls += len(calls)
+    return await fan_out(calls)
+
+def delete_question_messages(duel):
+    # Hands the question messages to the background deletion queue
+    for uid, msg_id in duel.message_ids():
+        if deletions.schedule(uid, msg_id):
+            duel.api_calls += 1
+    duel.clear_message_ids()
+
+def message_id_of(result):
+    return None if isinstance(result, Exception) else result.message_id
+
+def board_text(duel, user_id, body):
+    # A player's board shows the outcome of the previous round above `body`
+    if duel.round_result is None:
+        return body
+    outcome, scorer_id, scorer_name = duel.round_result
+    if outcome == 'correct':
+        header = 'Correct! You got the point.' if scorer_id == user_id else f'{scorer_name} answered correctly.'
+    elif outcome == 'timeout':
+        header = "Time's up! Nobody got the point."
+    else:
+        header = 'Nobody answered correctly.'
+    return f'{header}\n\n{body}'
+
+async def update_board(context, duel, user_id, text, reply_markup=None, priority=PRIORITY_HIGH):
+    # Edits the player's board message in place, or sends one if there is none yet
+    message_id = duel.message_id_for(user_id)
+    if message_id is not None:
+        try:
+            return await context.bot.edit_message_text(
+                chat_id=user_id, message_id=message_id, text=text, reply_markup=reply_markup, rate_limit_args=priority
+            )
+        except TelegramError as e:
+            logging.warning(f"Failed to edit board {message_id}, sending a new one: {e}")
+            duel.api_calls += 1
+    return await context.bot.send_message(chat_id=user_id, text=text, reply_markup=reply_markup, rate_limit_args=priority)
+
 async def send_question(context, duel_id):
     duel = active_duels.get(duel_id)
     if not duel:
         return
 
-    if duel['current_question'] >= 3:
+    if duel.current_question >= 3:
         # End the duel
         await end_duel(context, duel_id)
         return
 
-    # Delete previous messages if they exist
-    for uid, message_id in duel['message_ids'].items():
-        try:
-            await context.bot.delete_message(chat_id=uid, message_id=message_id)
-        except Exception as e:
-            logging.warning(f"Failed to delete message {message_id}: {e}")
+    # The keyboard was serialized when the question was compiled; only its
+    # payloads are signed for this duel
+    question = duel.questions[duel.current_question]
+    reply_markup = question.reply_markup_json(duel_id)
 
-    question_data = duel['questions'][duel['current_question']]
-    question = question_data['question']
-    options = question_data['options']
+    # Send question to both users
+    user1_id = duel.user1_id
+    user2_id = duel.user2_id
+    duel.reset_round()  # Reset answered flag and attempts
+
+    question_number = duel.current_question + 1
+    text = f'Question {question_number}: {question.text}'
+    if config.MESSAGE_MODE == 'board':
+        # Show the question on both boards, under the previous round's outcome
+        calls = [(uid, update_board(context, duel, uid, board_text(duel, uid, text), reply_markup)) for uid in duel.players]
+        message1, message2 = await duel_fan_out(duel, calls)
+        duel.round_result = None
+    else:
+        # Delete previous messages if they exist, then send the question to
+        # both chats concurrently
+        delete_question_messages(duel)
+        calls = [
+            (user1_id, context.bot.send_message(chat_id=user1_id, text=text, reply_markup=reply_markup, rate_limit_args=PRIORITY_HIGH)),
+            (user2_id, context.bot.send_message(chat_id=user2_id, text=text, reply_markup=reply_markup, rate_limit_args=PRIORITY_HIGH)),
+        ]
+        message1, message2 = await duel_fan_out(duel, calls)
+
+    # Track messages to delete/edit later; a failed send leaves no message to answer
+    duel.message1_id = message_id_of(message1)
+    duel.message2_id = message_id_of(message2)
+
+    # Unanswered questions count as a miss once the deadline passes
+    duel.question_deadline = scheduler.call_later(config.QUESTION_TIMEOUT, question_timed_out, context, duel_id, duel.current_question)
+
+async def answer_query(context, duel, query, text=None):
+    # Acknowledges a button press, carrying the presser's own result as a toast
+    # or alert on the button or, in 'message' mode, as a separate chat message
+    as_message = config.ANSWER_FEEDBACK == 'message'
+    try:
+        await query.answer(text=None if as_message else text, show_alert=config.ANSWER_FEEDBACK == 'alert')
+    except TelegramError as e:
+        logging.warning(f'Failed to answer callback query: {e}')
+    if as_message and text:
+        user_id = query.from_user.id
+        await duel_fan_out(duel, [(user_id, context.bot.send_message(chat_id=user_id, text=text, rate_limit_args=PRIORITY_LOW))])
 
-    # Create inline keyboard
-    keyboard = []
-    for option in options:
-        keyboard.append([InlineKeyboardButton(option, callback_data=option)])
+async def handle_answer_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = query.from_user.id
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Reject buttons we did not produce before touching any duel state, then
+    # find the duel the user is in
+    payload = callbacks.decode_answer(query.data)
+    duel = active_duels.get_by_user(user_id) if payload is not None else None
+    if duel is None or duel.duel_id != payload[0]:
+        # Not ours, or a button from a duel that is over
+        await answer_query(context, None, query)
+        return
+    _, question_id, option_index = payload
 
-    # Send question to both users
-    user1_id = duel['user1_id']
-    user2_id = duel['user2_id']
-    duel['answered'] = False  # Reset answered flag
-    duel['attempted_users'] = set()
+    # Answers are processed one at a time per duel; other duels run in parallel
+    async with duel.lock:
+        if active_duels.get(duel.duel_id) is not duel:
+            # The duel ended while we were waiting for the lock
+            await answer_query(context, None, query)
+            return
+        await process_answer(context, duel, query, question_id, option_index)
 
-    # Track messages to delete/edit later
-    question_number = duel['current_question'] + 1
-    message1 = await context.bot.send_message(chat_id=user1_id, text=f'Question {question_number}: {question}', reply_markup=reply_markup)
-    message2 = await context.bot.send_message(chat_id=user2_id, text=f'Question {question_number}: {question}', reply_markup=reply_markup)
+async def process_answer(context, duel, query, question_id, option_index):
+    # The callback query is acknowledged as soon as the answer is graded, with
+    # the result for the presser; only what the opponent needs to see is sent
+    # as a chat message
+    user_id = query.from_user.id
 
-    duel['message_ids'] = {user1_id: message1.message_id, user2_id: message2.message_id}
+    # Buttons of any other question are stale
+    current_question = duel.current()
+    if current_question is None or current_question.question_id != question_id:
+        await answer_query(context, duel, query)
+        return
 
-async def handle_answer_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    user_id = query.from_user.id
-    answer = query.data
-    await query.answer()  # Acknowledge the callback
-
-    # Find the duel the user is in
-    for duel_id, duel in active_duels.items():
-        if user_id == duel['user1_id'] or user_id == duel['user2_id']:
-            # Check if the question message id matches
-            message_id = duel['message_ids'].get(user_id)
-            if message_id != query.message.message_id:
-                return
-
-            if duel['answered']:
-                return
-            if user_id in duel['attempted_users']:
-                return
-
-            duel['attempted_users'].add(user_id)
-            current_question = duel['questions'][duel['current_question']]
-            correct_answer = current_question['answer']
-
-            if answer == correct_answer:
-                duel['scores'][user_id] += 1
-                duel['answered'] = True
-                opponent_id = duel['user1_id'] if user_id == duel['user2_id'] else duel['user2_id']
-                await context.bot.send_message(chat_id=user_id, text='Correct! You got the point.')
-                opponent_name = (await context.bot.get_chat(user_id)).first_name
-                await context.bot.send_message(chat_id=opponent_id, text=f'{opponent_name} answered correctly.')
-
-                # Delete both users' messages
-                await context.bot.delete_message(chat_id=user_id, message_id=query.message.message_id)
-                opponent_message_id = duel['message_ids'].get(opponent_id)
-                if opponent_message_id:
-                    await context.bot.delete_message(chat_id=opponent_id, message_id=opponent_message_id)
-
-                duel['current_question'] += 1
-                duel['attempted_users'] = set()
-                await asyncio.sleep(1)
-                await send_question(context, duel_id)
-                return
+    if duel.answered or duel.has_attempted(user_id):
+        await answer_query(context, duel, query)
+        return
+
+    duel.mark_attempted(user_id)
+    board_mode = config.MESSAGE_MODE == 'board'
+
+    if option_index == current_question.answer_index:
+        duel.add_point(user_id)
+        duel.answered = True
+        await answer_query(context, duel, query, 'Correct! You got the point.')
+        opponent_id = duel.opponent_of(user_id)
+        opponent_name = (await get_profile(context, user_id)).first_name
+
+        if board_mode:
+            # Shown on both boards together with the next question
+            duel.round_result = ('correct', user_id, opponent_name)
+        else:
+            # Tell the opponent and delete both users' messages
+            delete_question_messages(duel)
+            await duel_fan_out(duel, [
+                (opponent_id, context.bot.send_message(chat_id=opponent_id, text=f'{opponent_name} answered correctly.', rate_limit_args=PRIORITY_LOW)),
+            ])
+
+        finish_round(context, duel)
+        return
+    else:
+        await answer_query(context, duel, query, 'Incorrect answer.')
+        if board_mode:
+            if duel.all_attempted():
+                duel.round_result = ('missed', None, None)
             else:
-                await context.bot.send_message(chat_id=user_id, text='Incorrect answer.')
+                # Take the buttons away from this player until the round is over
+                text = f'Question {duel.current_question + 1}: {current_question.text}\n\nIncorrect answer.'
+                await duel_fan_out(duel, [(user_id, update_board(context, duel, user_id, text, priority=PRIORITY_LOW))])
+        elif duel.all_attempted():
+            delete_question_messages(duel)
+
+        if duel.all_attempted():
+            finish_round(context, duel)
+        return
+
+def finish_round(context, duel):
+    duel.cancel_question_deadline()
+    duel.current_question += 1
+    scheduler.call_later(config.QUESTION_DELAY, advance_question, context, duel.duel_id)
 
-                if len(duel['attempted_users']) == 2:
-                    for uid in [duel['user1_id'], duel['user2_id']]:
-                        msg_id = duel['message_ids'].get(uid)
-                        if msg_id:
-                            await context.bot.delete_message(chat_id=uid, message_id=msg_id)
+async def question_timed_out(context, duel_id, question_index):
+    duel = active_duels.get(duel_id)
+    if not duel:
+        return
+    async with duel.lock:
+        # Skip deadlines of questions that were resolved in the meantime
+        if active_duels.get(duel_id) is not duel or duel.current_question != question_index:
+            return
+        if duel.answered or duel.all_attempted():
+            return
+
+        duel.answered = True
+        if config.MESSAGE_MODE == 'board':
+            duel.round_result = ('timeout', None, None)
+        else:
+            delete_question_messages(duel)
+            calls = [(uid, context.bot.send_message(chat_id=uid, text="Time's up! Nobody got the point.", rate_limit_args=PRIORITY_LOW)) for uid in duel.players]
+            await duel_fan_out(duel, calls)
+
+        duel.question_deadline = None
+        finish_round(context, duel)
+
+async def expire_duel(context, duel_id):
+    # Cleanup for duels that outlive DUEL_TIMEOUT, e.g. when sending a question failed
+    duel = active_duels.get(duel_id)
+    if not duel:
+        return
+    async with duel.lock:
+        await end_duel(context, duel_id)
 
-                    duel['current_question'] += 1
-                    duel['attempted_users'] = set()
-                    await asyncio.sleep(1)
-                    await send_question(context, duel_id)
-                return
+async def advance_question(context, duel_id):
+    duel = active_duels.get(duel_id)
+    if not duel:
+        return
+    async with duel.lock:
+        await send_question(context, duel_id)
 
 async def end_duel(context, duel_id):
-    duel = active_duels.pop(duel_id, None)
+    duel = active_duels.remove(duel_id)
     if not duel:
         return
-    user1_id = duel['user1_id']
-    user2_id = duel['user2_id']
-    scores = duel['scores']
-    user1_score = scores[user1_id]
-    user2_score = scores[user2_id]
-
-    # Delete any remaining question messages
-    for uid in [user1_id, user2_id]:
-        msg_id = duel['message_ids'].get(uid)
-        if msg_id:
-            try:
-                await context.bot.delete_message(chat_id=uid, message_id=msg_id)
-            except:
-                pass
+    duel.cancel_timers()
+    user1_id = duel.user1_id
+    user2_id = duel.user2_id
+    user1_score = duel.score1
+    user2_score = duel.score2
 
+    winner_id = None
     if user1_score > user2_score:
         winner_id = user1_id
         loser_id = user2_id
-        result_text = 'Duel over! {} wins with a score of {} to {}.'.format((await context.bot.get_chat(user1_id)).first_name, user1_score, user2_score)
+        result_text = 'Duel over! {} wins with a score of {} to {}.'.format((await get_profile(context, user1_id)).first_name, user1_score, user2_score)
     elif user2_score > user1_score:
         winner_id = user2_id
         loser_id = user1_id
-        result_text = 'Duel over! {} wins with a score of {} to {}.'.format((await context.bot.get_chat(user2_id)).first_name, user2_score, user1_score)
+        result_text = 'Duel over! {} wins with a score of {} to {}.'.format((await get_profile(context, user2_id)).first_name, user2_score, user1_score)
     else:
         result_text = 'Duel over! It\'s a tie with a score of {} to {}.'.format(user1_score, user2_score)
 
     if winner_id:
-        cursor.execute('UPDATE users SET rating = rating + 10 WHERE user_id = ?', (winner_id,))
-        cursor.execute('UPDATE users SET rating = rating - 10 WHERE user_id = ?', (loser_id,))
-    conn.commit()
-
-    await context.bot.send_message(chat_id=user1_id, text=result_text)
-    await context.bot.send_message(chat_id=user2_id, text=result_text)
+        deltas = {winner_id: 10, loser_id: -10}
+        for user_id, delta in deltas.items():
+            write_batcher.add_rating(user_id, delta)
+        for user_id, (username, rating) in (await current_ratings(deltas)).items():
+            top_players.update(user_id, rating, username)
+            rank_index.move(rating - deltas[user_id], rating)
+        if top_players.needs_reload:
+            scheduler.call_later(0, reload_leaderboard)
+
+    if config.MESSAGE_MODE == 'board':
+        # The result replaces the question on each board, removing its buttons
+        calls = [(uid, update_board(context, duel, uid, board_text(duel, uid, result_text))) for uid in duel.players]
+    else:
+        # Delete any remaining question messages and announce the result in both chats
+        delete_question_messages(duel)
+        calls = [(uid, context.bot.send_message(chat_id=uid, text=result_text, rate_limit_args=PRIORITY_HIGH)) for uid in duel.players]
+    await duel_fan_out(duel, calls)
+
+    totals = api_calls_per_mode.setdefault(config.MESSAGE_MODE, [0, 0])
+    totals[0] += 1
+    totals[1] += duel.api_calls
+    logging.debug(f'Duel {duel_id} finished after {duel.api_calls} Bot API calls ({config.MESSAGE_MODE} mode)')
+
+async def current_ratings(user_ids):
+    # (username, rating) of registered users, including changes the write
+    # batcher hasn't committed yet. The snapshot tells which batches the rows
+    # already include, so each is counted once; a batch the batcher settled
+    # after the snapshot was taken is in neither, so the read is repeated then.
+    while True:
+        rows, seen_seq = await db.read_snapshot(fetch_users, list(user_ids))
+        if write_batcher.committed_seq <= seen_seq:
+            break
+    pending = {user_id: write_batcher.pending_rating(user_id, seen_seq) for user_id in user_ids}
+    registering = {user_id for user_id in user_ids if write_batcher.is_registering(user_id)}
+    users = {user_id: (username, rating) for user_id, username, rating in rows}
+    for user_id in registering:
+        users.setdefault(user_id, (None, 1000))
+    for user_id, (username, rating) in users.items():
+        profile = profiles.get(user_id)
+        users[user_id] = (profile.username if profile else username, rating + pending[user_id])
+    return users
+
+async def reload_leaderboard():
+    # Refills the in-memory leaderboard once too many entries fell below its floor
+    top_players.begin_reload()
+    try:
+        await write_batcher.flush()
+        rows = await db.read(fetch_top_users, top_players.load_limit)
+    except Exception:
+        top_players.cancel_reload()
+        raise
+    top_players.finish_reload(rows)
 
 async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    cursor.execute('SELECT username, rating FROM users ORDER BY rating DESC LIMIT 10')
-    results = cursor.fetchall()
-    text = '🏆 Leaderboard 🏆\n\n'
-    for i, (username, rating) in enumerate(results, start=1):
-        text += '{}. @{} - {}\n'.format(i, username or 'Anonymous', rating)
-    await update.message.reply_text(text)
+    await update.message.reply_text(top_players.text())
 
 async def rating(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    cursor.execute('SELECT rating FROM users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
+    result = (await current_ratings([user_id])).get(user_id)
     if result:
-        rating = result[0]
+        rating = result[1]
         title = get_title(rating)
-        await update.message.reply_text('Your rating: {}\nYour title: {}'.format(rating, title))
+        await update.message.reply_text(
+            'Your rating: {}\nYour title: {}\nYour rank: {} of {} (ahead of {:.1f}% of players)'.format(
+                rating, title, rank_index.rank(rating), rank_index.total, rank_index.percentile(rating)
+            )
+        )
     else:
         await update.message.reply_text('You are not registered yet. Send /start to register.')
 
+async def reload_questions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in config.ADMIN_IDS:
+        return
+    try:
+        stats = await question_reloader.reload()
+    except Exception as e:
+        logging.exception('Question reload failed')
+        await update.message.reply_text(f'Reload failed: {e}')
+        return
+    await update.message.reply_text(
+        'Questions reloaded: {} added, {} removed, {} invalid, {} total.'.format(stats['inserted'], stats['deleted'], stats['invalid'], stats['count'])
+    )
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in config.ADMIN_IDS:
+        return
+    lines = [
+        f'Active duels: {len(active_duels)}',
+        f'Waiting users: {len(waiting_users)}',
+        f'Profile cache: {len(profiles)} entries, {profiles.hits} hits, {profiles.misses} misses',
+    ]
+    lines.append(
+        f'Deletion queue: {len(deletions)} pending, {deletions.deleted} deleted, {deletions.gone} already gone, '
+        f'{deletions.retried} retries, {deletions.failed} failed, {deletions.coalesced} coalesced'
+    )
+    lines.append(
+        f'Dispatcher: {dispatcher.running}/{dispatcher.limit} running, peak {dispatcher.peak_running}, '
+        f'{dispatcher.busy_keys} busy keys, {dispatcher.processed} processed, {dispatcher.queued_behind_key} queued behind their key'
+    )
+    if webhook_server is not None:
+        lines.append(f'Webhook: {webhook_server.updates} updates, {webhook_server.rejected} rejected')
+    lines.append(f'Database: {db.writes} writes ({db.write_backlog} queued), {db.reads} reads, {db.checkpoints} checkpoints')
+    lines.append(f'Leaderboard: {len(top_players)} tracked, {top_players.renders} renders, {top_players.reloads} reloads')
+    lines.append(
+        f'Write batcher: {len(write_batcher)} pending, {write_batcher.operations} changes in {write_batcher.commits} commits '
+        f'({write_batcher.operations - write_batcher.commits} saved), {write_batcher.merged} merged, {write_batcher.failed_flushes} failed flushes'
+    )
+    limiter = rate_limiter.stats()
+    lines.append(
+        'Rate limiter: {} queued {}, {} requests, {:.3f}s average wait, {:.3f}s max wait, {} flood waits, {:.1f} req/s'.format(
+            limiter['queue_depth'], limiter['lane_depths'], limiter['requests'], limiter['average_wait'],
+            limiter['max_wait'], limiter['retry_afters'], limiter['overall_rate'],
+        )
+    )
+    for request in (send_request, get_updates_request):
+        pool = request.stats()
+        lines.append(
+            'HTTP pool ({}): {}/{} in use, peak {}, {} requests, {} waited, {:.3f}s average wait, {:.3f}s max wait, {} pool timeouts'.format(
+                request.name, pool['in_flight'], pool['pool_size'], pool['peak_in_flight'], pool['requests'],
+                pool['waited'], pool['average_wait'], pool['max_wait'], pool['pool_timeouts'],
+            )
+        )
+    for mode, (duels, calls) in api_calls_per_mode.items():
+        lines.append(f'Bot API calls per duel ({mode} mode): {calls / duels:.1f} over {duels} duels')
+    await update.message.reply_text('\n'.join(lines))
+
+async def post_init(application):
+    scheduler.start()
+    deletions.start(application.bot)
+    if config.QUESTIONS_RELOAD_INTERVAL > 0:
+        scheduler.call_every(config.QUESTIONS_RELOAD_INTERVAL, question_reloader.check)
+    if config.DB_CHECKPOINT_INTERVAL > 0 and config.DB_JOURNAL_MODE.lower() == 'wal':
+        scheduler.call_every(config.DB_CHECKPOINT_INTERVAL, db.checkpoint)
+
+async def post_shutdown(application):
+    await deletions.stop()
+    await scheduler.stop()
+    await write_batcher.flush()
+    await asyncio.to_thread(db.close)
+
 def main():
+    global webhook_server
     init_db()
-    application = ApplicationBuilder().token('7587237355:AAEhqITXcphKgTzu-xcWAmUOtM2ukxGNgZg').build()
+    # Updates are handled concurrently, in order per duel or per user (see update_key)
+    application = (
+        ApplicationBuilder()
+        .token('7587237355:AAEhqITXcphKgTzu-xcWAmUOtM2ukxGNgZg')
+        .application_class(KeyedApplication, kwargs={'dispatcher': dispatcher, 'update_key': update_key})
+        .concurrent_updates(config.UPDATE_MAX_PENDING)
+        .request(send_request)
+        .get_updates_request(get_updates_request)
+        .rate_limiter(rate_limiter)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Handlers
+    application.add_handler(TypeHandler(Update, remember_user), group=-1)
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('duel', duel))
+    application.add_handler(CommandHandler('cancel', cancel))
     application.add_handler(CommandHandler('leaderboard', leaderboard))
     application.add_handler(CommandHandler('rating', rating))
+    application.add_handler(CommandHandler('reload', reload_questions))
+    application.add_handler(CommandHandler('stats', stats))
     application.add_handler(CallbackQueryHandler(handle_answer_callback))
 
-    application.run_polling()
+    if config.WEBHOOK_URL:
+        secret_token = config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        webhook_server = webhook.WebhookServer(application, config.WEBHOOK_LISTEN, config.WEBHOOK_PORT, config.WEBHOOK_PATH, secret_token)
+        webhook.run_webhook(application, webhook_server, config.WEBHOOK_URL, secret_token)
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,77 @@
+# Event-loop lag while the leaderboard query runs over a large users table,
+# with the query executed directly on the loop (as before) vs. through
+# Database. A ticker task sleeps 1 ms at a time; lag is how late it wakes up.
+#
+#   python benchmarks/db_loop_lag.py [users]
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import Database  # noqa: E402
+
+LEADERBOARD = 'SELECT username, rating FROM users ORDER BY rating DESC LIMIT 10'
+
+
+def build(path, users):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, rating INTEGER DEFAULT 1000, first_name TEXT)')
+    conn.executemany(
+        'INSERT INTO users VALUES (?, ?, ?, ?)',
+        ((user_id, f'user{user_id}', random.randint(600, 2400), f'User {user_id}') for user_id in range(users)),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def measure(query, rounds=5):
+    lags, stop = [], asyncio.Event()
+    task = asyncio.ensure_future(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+    elapsed = 0.0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await query()
+        elapsed += time.perf_counter() - started
+        await asyncio.sleep(0.01)  # let the ticker see each query separately
+    stop.set()
+    await task
+    return elapsed / rounds, max(lags)
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'users.db')
+        build(path, users)
+
+        conn = sqlite3.connect(path)
+
+        async def on_loop():
+            conn.execute(LEADERBOARD).fetchall()
+
+        db = Database(path)
+        before = await measure(on_loop)
+        after = await measure(lambda: db.fetchall(LEADERBOARD))
+        conn.close()
+        db.close()
+
+    print(f'{users} users, leaderboard query without an index on rating')
+    print(f'on the loop:  {before[0] * 1000:6.1f} ms/query, max loop lag {before[1] * 1000:6.1f} ms')
+    print(f'Database:     {after[0] * 1000:6.1f} ms/query, max loop lag {after[1] * 1000:6.1f} ms')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
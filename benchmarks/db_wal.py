@@ -0,0 +1,87 @@
+# Leaderboard reads running concurrently with rating writes, with the old
+# default settings (rollback journal, synchronous=FULL) vs. WAL with
+# synchronous=NORMAL. Both go through Database: one writer thread committing
+# a duel result at a time, and a pool of readers running the leaderboard.
+#
+#   python benchmarks/db_wal.py [users] [seconds] [readers]
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import Database  # noqa: E402
+
+LEADERBOARD = 'SELECT username, rating FROM users ORDER BY rating DESC LIMIT 10'
+RATING = 'UPDATE users SET rating = rating + ? WHERE user_id = ?'
+
+SETTINGS = {
+    'rollback journal': dict(journal_mode='delete', synchronous='full'),
+    'WAL': dict(journal_mode='wal', synchronous='normal', wal_autocheckpoint=0),
+}
+
+
+def build(path, users):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, rating INTEGER DEFAULT 1000, first_name TEXT)')
+    conn.executemany(
+        'INSERT INTO users VALUES (?, ?, ?, ?)',
+        ((user_id, f'user{user_id}', random.randint(600, 2400), f'User {user_id}') for user_id in range(users)),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def writer(db, users, deadline, latencies):
+    while time.perf_counter() < deadline:
+        winner, loser = random.sample(range(users), 2)
+        started = time.perf_counter()
+        await db.executemany(RATING, [(10, winner), (-10, loser)])
+        latencies.append(time.perf_counter() - started)
+
+
+async def reader(db, deadline, latencies):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await db.fetchall(LEADERBOARD)
+        latencies.append(time.perf_counter() - started)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def measure(path, users, seconds, readers, settings):
+    db = Database(path, readers=readers, busy_timeout=30000, **settings)
+    writes, reads = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(writer(db, users, deadline, writes), *(reader(db, deadline, reads) for _ in range(readers)))
+    if settings['journal_mode'] == 'wal':
+        await db.checkpoint('TRUNCATE')
+    db.close()
+    return writes, reads
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    readers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    print(f'{users} users, {readers} concurrent leaderboard readers, {seconds:.0f} s per run')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'users.db')
+        build(path, users)
+        for name, settings in SETTINGS.items():
+            writes, reads = await measure(path, users, seconds, readers, settings)
+            print(
+                f'{name + ":":18} {len(writes) / seconds:6.0f} duel results/s (p99 {percentile(writes, 0.99):6.1f} ms)   '
+                f'{len(reads) / seconds:5.0f} leaderboards/s (p50 {percentile(reads, 0.5):6.1f} ms, p99 {percentile(reads, 0.99):6.1f} ms)'
+            )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
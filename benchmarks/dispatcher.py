@@ -0,0 +1,62 @@
+# Updates per second through KeyedDispatcher as the number of independent
+# duels grows, against handling updates one at a time. Every handler waits on a
+# fake Bot API call with a fixed round-trip time; updates of the same duel must
+# still come out in arrival order.
+#
+#   python benchmarks/dispatcher.py [rtt_ms] [updates_per_duel] [limit]
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dispatcher import KeyedDispatcher  # noqa: E402
+
+
+async def handle(rtt, seen, duel_id, index):
+    await asyncio.sleep(rtt)
+    seen.setdefault(duel_id, []).append(index)
+
+
+def interleaved(duels, per_duel):
+    # Updates arrive round-robin across duels, as they would from live games
+    return [(duel_id, index) for index in range(per_duel) for duel_id in range(duels)]
+
+
+async def sequential(updates, rtt):
+    seen = {}
+    for duel_id, index in updates:
+        await handle(rtt, seen, duel_id, index)
+    return seen
+
+
+async def keyed(updates, rtt, limit):
+    seen = {}
+    dispatcher = KeyedDispatcher(limit)
+    await asyncio.gather(*(dispatcher.run(duel_id, handle, rtt, seen, duel_id, index) for duel_id, index in updates))
+    return seen
+
+
+async def measure(runner, updates, *args):
+    started = time.perf_counter()
+    seen = await runner(updates, *args)
+    elapsed = time.perf_counter() - started
+    assert all(indexes == sorted(indexes) for indexes in seen.values()), 'updates of a duel ran out of order'
+    return len(updates) / elapsed
+
+
+async def main():
+    rtt = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.02
+    per_duel = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    print(f'round trip {rtt * 1000:.0f} ms, {per_duel} updates per duel, concurrency limit {limit}')
+    for duels in (1, 4, 16, 64, 256):
+        updates = interleaved(duels, per_duel)
+        before = await measure(sequential, updates[:200], rtt)
+        after = await measure(keyed, updates, rtt, limit)
+        print(f'{duels:4} duels:  sequential {before:7.0f} updates/s   keyed {after:7.0f} updates/s')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
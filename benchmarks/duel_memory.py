@@ -0,0 +1,59 @@
+# Bytes per live duel: the old dict-based duel vs. the slotted Duel record.
+#
+#   python benchmarks/duel_memory.py [number_of_duels]
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from duels import Duel, DuelIdAllocator  # noqa: E402
+
+QUESTIONS = [{'question': f'q{i}', 'options': ['a', 'b', 'c', 'd'], 'answer': 'a'} for i in range(100)]
+
+
+def legacy_duel(user1_id, user2_id):
+    return {
+        'user1_id': user1_id,
+        'user2_id': user2_id,
+        'current_question': 0,
+        'questions': random.sample(QUESTIONS, 3),
+        'scores': {user1_id: 0, user2_id: 0},
+        'answered': False,
+        'attempted_users': {user1_id},
+        'message_ids': {user1_id: 100001, user2_id: 100002},
+    }
+
+
+def slotted_duel(duel_ids, user1_id, user2_id):
+    duel = Duel(duel_ids.allocate(), user1_id, user2_id, random.sample(QUESTIONS, 3))
+    duel.mark_attempted(user1_id)
+    duel.message1_id = 100001
+    duel.message2_id = 100002
+    return duel
+
+
+def measure(factory, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # User ids above the small-int cache so they are allocated like real ones
+    duels = [factory(10**9 + 2 * i, 10**9 + 2 * i + 1) for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del duels
+    return used / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    duel_ids = DuelIdAllocator()
+    legacy = measure(legacy_duel, count)
+    slotted = measure(lambda u1, u2: slotted_duel(duel_ids, u1, u2), count)
+    print(f'duels:        {count}')
+    print(f'dict duel:    {legacy:.0f} bytes/duel')
+    print(f'Duel record:  {slotted:.0f} bytes/duel ({100 * (1 - slotted / legacy):.0f}% less)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# Wall time of the Bot API calls behind one question round, issued one after
+# another (as before) vs. through fan_out(), against a fake bot with a fixed
+# round-trip time.
+#
+#   python benchmarks/fanout.py [rtt_ms]
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fanout import fan_out  # noqa: E402
+
+USER1, USER2 = 1, 2
+
+
+class SlowBot:
+    def __init__(self, rtt):
+        self.rtt = rtt
+
+    async def call(self, *args):
+        await asyncio.sleep(self.rtt)
+
+
+def question_round(bot):
+    # send_question: send the question to both users
+    # process_answer (correct): notify the answering user and delete their
+    # question; look up their name, notify the opponent and delete theirs
+    return [
+        [(USER1, bot.call()), (USER2, bot.call())],
+        [(USER1, bot.call()), (USER1, bot.call()), (USER2, bot.call()), (USER2, bot.call()), (USER2, bot.call())],
+    ]
+
+
+async def sequential(bot):
+    for calls in question_round(bot):
+        for _, call in calls:
+            await call
+
+
+async def concurrent(bot):
+    for calls in question_round(bot):
+        await fan_out(calls)
+
+
+async def measure(runner, bot, rounds=5):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await runner(bot)
+    return (time.perf_counter() - started) / rounds
+
+
+async def main():
+    rtt = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05
+    bot = SlowBot(rtt)
+    before = await measure(sequential, bot)
+    after = await measure(concurrent, bot)
+    print(f'round trip:   {rtt * 1000:.0f} ms')
+    print(f'sequential:   {before * 1000:.0f} ms/question')
+    print(f'fan_out:      {after * 1000:.0f} ms/question (saves {(before - after) * 1000:.0f} ms)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+# Commits and throughput for a burst of finished duels and registrations,
+# written one transaction per event (as before) vs. through WriteBatcher.
+# Both use Database with the bot's default WAL settings, on a file in the
+# current directory so fsyncs hit the real disk.
+#
+#   python benchmarks/group_commit.py [duels] [players]
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import Database  # noqa: E402
+from scheduler import Scheduler  # noqa: E402
+from write_batcher import WriteBatcher  # noqa: E402
+
+SCHEMA = 'CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, rating INTEGER DEFAULT 1000, first_name TEXT)'
+
+
+def events(duels, players):
+    # A registration for every player, then duels between random pairs
+    rng = random.Random(1)
+    for user_id in range(players):
+        yield 'register', user_id
+    for _ in range(duels):
+        yield 'duel', rng.sample(range(players), 2)
+
+
+async def per_event(db, duels, players):
+    commits = 0
+    for kind, payload in events(duels, players):
+        if kind == 'register':
+            await db.execute('INSERT INTO users (user_id, username, first_name) VALUES (?, ?, ?)', (payload, f'u{payload}', 'User'))
+        else:
+            winner, loser = payload
+            await db.executemany('UPDATE users SET rating = rating + ? WHERE user_id = ?', [(10, winner), (-10, loser)])
+        commits += 1
+    return commits
+
+
+async def batched(db, duels, players):
+    scheduler = Scheduler()
+    scheduler.start()
+    batcher = WriteBatcher(db, scheduler, window=0.25, max_ops=500)
+    for kind, payload in events(duels, players):
+        if kind == 'register':
+            batcher.register(payload, f'u{payload}', 'User')
+        else:
+            winner, loser = payload
+            batcher.add_rating(winner, 10)
+            batcher.add_rating(loser, -10)
+        await asyncio.sleep(0)  # events arrive from separate handlers
+    await batcher.flush()
+    await scheduler.stop()
+    return batcher.commits
+
+
+async def measure(runner, duels, players):
+    with tempfile.TemporaryDirectory(dir='.') as directory:
+        db = Database(os.path.join(directory, 'users.db'), journal_mode='wal', synchronous='normal')
+        await db.execute(SCHEMA)
+        started = time.perf_counter()
+        commits = await runner(db, duels, players)
+        elapsed = time.perf_counter() - started
+        ratings = await db.fetchall('SELECT user_id, rating FROM users ORDER BY user_id')
+        db.close()
+    return elapsed, commits, ratings
+
+
+async def main():
+    duels = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    print(f'{players} registrations and {duels} finished duels')
+    before = await measure(per_event, duels, players)
+    after = await measure(batched, duels, players)
+    assert before[2] == after[2], 'batched writes ended with different ratings'
+    for name, (elapsed, commits, _) in (('per event', before), ('batched', after)):
+        print(f'{name + ":":11} {elapsed:6.2f} s, {commits:6} commits, {(duels + players) / elapsed:8.0f} events/s')
+    print(f'commits saved: {before[1] - after[1]} ({1 - after[1] / before[1]:.1%})')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+# Cost of preparing the reply markup for one send_question() round (two
+# sends): building the keyboard per call vs. the precompiled question bank,
+# which only signs the per-duel payloads.
+#
+#   python benchmarks/question_payload.py [rounds]
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+from questions import compile_question  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def per_call(question_data):
+    # What send_question() used to do: build buttons and markup, then PTB
+    # serializes the markup once for each of the two sends.
+    keyboard = []
+    for option in question_data['options']:
+        keyboard.append([InlineKeyboardButton(option, callback_data=option)])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    for _ in range(2):
+        json.dumps(reply_markup.to_dict())
+
+
+def precompiled(question):
+    reply_markup = question.reply_markup_json(1)
+    for _ in range(2):
+        reply_markup
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    with open(os.path.join(ROOT, 'questions_list.json'), 'r', encoding='utf-8') as file:
+        questions_list = json.load(file)
+    question = compile_question(1, questions_list[0])
+
+    old = timeit.timeit(lambda: per_call(questions_list[0]), number=rounds) / rounds
+    new = timeit.timeit(lambda: precompiled(question), number=rounds) / rounds
+    print(f'rounds:       {rounds}')
+    print(f'per call:     {old * 1e6:.2f} us/round')
+    print(f'precompiled:  {new * 1e6:.2f} us/round ({old / new:.0f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Global rank lookups at 10M users: COUNT(*) over the users table (with the
+# rating index) vs. RatingRankIndex, plus the cost of loading the index at
+# startup and of moving a rating. Builds a throwaway database in the current
+# directory; pass a smaller user count for a quicker run.
+#
+#   python benchmarks/rank_index.py [users]
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rank_index import RatingRankIndex  # noqa: E402
+
+
+def build(path, users):
+    rng = random.Random(1)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, rating INTEGER DEFAULT 1000, first_name TEXT)')
+    conn.executemany(
+        'INSERT INTO users (user_id, rating) VALUES (?, ?)',
+        ((user_id, int(rng.gauss(1200, 250))) for user_id in range(users)),
+    )
+    conn.execute('CREATE INDEX idx_users_rating ON users (rating DESC)')
+    conn.commit()
+    return conn
+
+
+def timed(func, *args, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return result, (time.perf_counter() - started) / repeat
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    with tempfile.TemporaryDirectory(dir='.') as directory:
+        print(f'building {users} users...')
+        conn = build(os.path.join(directory, 'users.db'), users)
+
+        index = RatingRankIndex()
+        counts, load_query = timed(lambda: conn.execute('SELECT rating, COUNT(*) FROM users GROUP BY rating').fetchall())
+        _, load_build = timed(index.load, counts)
+
+        probes = [1000, 1200, 1500, 1900]
+        print(f'startup load: {load_query * 1000:.0f} ms query + {load_build * 1000:.1f} ms build ({len(counts)} distinct ratings)')
+        for rating in probes:
+            (above,), sql = timed(lambda: conn.execute('SELECT COUNT(*) FROM users WHERE rating > ?', (rating,)).fetchone())
+            rank, fenwick = timed(index.rank, rating, repeat=10000)
+            assert rank == above + 1, (rank, above)
+            print(
+                f'rating {rating}: rank {rank} of {index.total}, '
+                f'COUNT(*) {sql * 1000:8.2f} ms   Fenwick {fenwick * 1e6:6.2f} µs'
+            )
+
+        _, move = timed(lambda: index.move(1200, 1210) or index.move(1210, 1200), repeat=10000)
+        print(f'rating change: {move / 2 * 1e6:.2f} µs')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# Time from an update being produced on the Telegram side to its handler
+# running, with long polling vs. the built-in webhook listener. A fake Bot API
+# server on localhost hands updates to getUpdates and plays Telegram for the
+# webhook, adding a one-way network delay to every trip.
+#
+#   python benchmarks/webhook_latency.py [delay_ms] [updates] [rate_per_second]
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from telegram import Update  # noqa: E402
+from telegram.ext import ApplicationBuilder, TypeHandler  # noqa: E402
+
+import webhook  # noqa: E402
+
+SECRET = 'benchmark-secret'
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Quiz', 'username': 'quiz_bot'}
+
+
+def make_update(update_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': 2, 'type': 'private'},
+            'from': {'id': 2, 'is_bot': False, 'first_name': 'Player'},
+            'text': '/duel',
+        },
+    }
+
+
+class FakeBotApi:
+    # Answers the handful of methods the application calls; getUpdates is held
+    # open until updates are available, like Telegram's long polling
+    def __init__(self, delay):
+        self.delay = delay
+        self.pending = []
+        self.available = asyncio.Event()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def publish(self, update):
+        self.pending.append(update)
+        self.available.set()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request = await webhook.read_request(reader)
+                if request is None:
+                    break
+                _, path, _, _ = request
+                method = path.rsplit('/', 1)[-1]
+                await asyncio.sleep(self.delay)
+                if method == 'getMe':
+                    result = BOT_USER
+                elif method == 'getUpdates':
+                    try:
+                        await asyncio.wait_for(self.available.wait(), 10)
+                    except asyncio.TimeoutError:
+                        pass
+                    result, self.pending = self.pending, []
+                    self.available.clear()
+                else:
+                    result = True
+                await asyncio.sleep(self.delay)
+                webhook.write_response(writer, 200, json.dumps({'ok': True, 'result': result}).encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class WebhookClient:
+    # Telegram's side of the webhook: POSTs updates over one kept-alive connection
+    def __init__(self, port, delay):
+        self.port = port
+        self.delay = delay
+        self.lock = asyncio.Lock()
+        self.reader = self.writer = None
+
+    async def post(self, update):
+        await asyncio.sleep(self.delay)
+        body = json.dumps(update).encode()
+        async with self.lock:
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+            self.writer.write(
+                (
+                    'POST /telegram HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                    f'X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n'
+                ).encode() + body
+            )
+            await self.writer.drain()
+            await webhook.read_request(self.reader)  # status line and headers of the response
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def build_application(api_port, latencies, sent, done, total):
+    async def record(update, context):
+        latencies.append(time.perf_counter() - sent[update.update_id])
+        if len(latencies) == total:
+            done.set()
+
+    application = ApplicationBuilder().token('1:benchmark').base_url(f'http://127.0.0.1:{api_port}/bot').build()
+    application.add_handler(TypeHandler(Update, record))
+    return application
+
+
+async def produce(deliver, sent, total, rate):
+    for update_id in range(1, total + 1):
+        sent[update_id] = time.perf_counter()
+        asyncio.ensure_future(deliver(make_update(update_id)))
+        await asyncio.sleep(1 / rate)
+
+
+async def measure(mode, delay, total, rate):
+    api = FakeBotApi(delay)
+    api_port = await api.start()
+    latencies, sent, done = [], {}, asyncio.Event()
+    application = build_application(api_port, latencies, sent, done, total)
+    await application.initialize()
+
+    client = server = None
+    if mode == 'polling':
+        await application.updater.start_polling(timeout=10)
+        deliver = api.publish
+    else:
+        server = webhook.WebhookServer(application, '127.0.0.1', 0, '/telegram', SECRET)
+        await server.start()
+        client = WebhookClient(server.port, delay)
+        deliver = client.post
+    await application.start()
+
+    async def deliver_async(update):
+        result = deliver(update)
+        if asyncio.iscoroutine(result):
+            await result
+
+    await produce(deliver_async, sent, total, rate)
+    await asyncio.wait_for(done.wait(), 60)
+
+    if application.updater.running:
+        await application.updater.stop()
+    await application.stop()
+    if server is not None:
+        client.close()
+        await server.stop()
+    await application.shutdown()
+    await api.stop()
+    return latencies
+
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    return f'p50 {p50 * 1000:6.1f} ms   p99 {p99 * 1000:6.1f} ms   max {latencies[-1] * 1000:6.1f} ms'
+
+
+async def main():
+    delay = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.025
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 100
+    print(f'one-way delay {delay * 1000:.0f} ms, {total} updates at {rate:.0f}/s')
+    for mode in ('polling', 'webhook'):
+        print(f'{mode + ":":9} {summary(await measure(mode, delay, total, rate))}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
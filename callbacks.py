@@ -0,0 +1,39 @@
+import hashlib
+import secrets
+
+# Telegram rejects callback_data longer than 64 bytes
+MAX_CALLBACK_DATA = 64
+
+# Per-process key: buttons from a previous run (whose duels are gone anyway)
+# or crafted by a client fail the checksum and are dropped on arrival.
+_KEY = secrets.token_bytes(16)
+
+
+def _checksum(body):
+    return hashlib.blake2s(body.encode(), key=_KEY, digest_size=4).hexdigest()
+
+
+def encode_answer(duel_id, question_id, option_index):
+    # "<duel id hex>.<question id hex>.<option index>.<checksum>". Duel ids are
+    # never reused, so a button left over from an earlier duel that asked the
+    # same question can't answer the current one.
+    body = f'{duel_id:x}.{question_id:x}.{option_index}'
+    data = f'{body}.{_checksum(body)}'
+    if len(data.encode()) > MAX_CALLBACK_DATA:
+        raise ValueError(f'callback_data {data!r} exceeds {MAX_CALLBACK_DATA} bytes')
+    return data
+
+
+def decode_answer(data):
+    # Returns (duel_id, question_id, option_index), or None for anything we
+    # did not produce ourselves.
+    if not data:
+        return None
+    body, _, checksum = data.rpartition('.')
+    if not body or not secrets.compare_digest(checksum, _checksum(body)):
+        return None
+    try:
+        duel_id, question_id, option_index = body.split('.')
+        return int(duel_id, 16), int(question_id, 16), int(option_index)
+    except ValueError:
+        return None
@@ -0,0 +1,91 @@
+import os
+
+# Pause between an answer being resolved and the next question being sent, in seconds
+QUESTION_DELAY = float(os.environ.get('QUIZ_QUESTION_DELAY', '1'))
+
+# Time players have to answer a question before it counts as a miss, in seconds
+QUESTION_TIMEOUT = float(os.environ.get('QUIZ_QUESTION_TIMEOUT', '30'))
+
+# Duels still running after this many seconds are considered abandoned and ended
+DUEL_TIMEOUT = float(os.environ.get('QUIZ_DUEL_TIMEOUT', '600'))
+
+# Number of compiled questions kept in memory by the question store's LRU
+QUESTION_CACHE_SIZE = int(os.environ.get('QUIZ_QUESTION_CACHE_SIZE', '4096'))
+
+# How often questions_list.json is checked for changes, in seconds (0 disables)
+QUESTIONS_RELOAD_INTERVAL = float(os.environ.get('QUIZ_QUESTIONS_RELOAD_INTERVAL', '30'))
+
+# Telegram user ids allowed to run admin commands such as /reload
+ADMIN_IDS = {int(user_id) for user_id in os.environ.get('QUIZ_ADMIN_IDS', '').split(',') if user_id.strip()}
+
+# User profiles (names) cached to avoid get_chat calls: maximum entries and lifetime in seconds
+PROFILE_CACHE_SIZE = int(os.environ.get('QUIZ_PROFILE_CACHE_SIZE', '100000'))
+PROFILE_CACHE_TTL = float(os.environ.get('QUIZ_PROFILE_CACHE_TTL', '3600'))
+
+# 'classic' sends and deletes a message per question and per feedback; 'board' keeps
+# one message per player and edits it in place
+MESSAGE_MODE = os.environ.get('QUIZ_MESSAGE_MODE', 'classic')
+if MESSAGE_MODE not in ('classic', 'board'):
+    raise ValueError(f'QUIZ_MESSAGE_MODE must be classic or board, not {MESSAGE_MODE!r}')
+
+# How players learn the result of their own answer: 'toast' shows it on the pressed button
+# (answerCallbackQuery text), 'alert' as a popup to dismiss, 'message' as a separate chat message
+ANSWER_FEEDBACK = os.environ.get('QUIZ_ANSWER_FEEDBACK', 'toast')
+if ANSWER_FEEDBACK not in ('toast', 'alert', 'message'):
+    raise ValueError(f'QUIZ_ANSWER_FEEDBACK must be toast, alert or message, not {ANSWER_FEEDBACK!r}')
+
+# Outgoing Bot API rate limits: requests per second and burst size overall and per chat,
+# and how often a request is retried after Telegram's flood control
+RATE_LIMIT_OVERALL = float(os.environ.get('QUIZ_RATE_LIMIT_OVERALL', '30'))
+RATE_LIMIT_OVERALL_BURST = float(os.environ.get('QUIZ_RATE_LIMIT_OVERALL_BURST', '30'))
+RATE_LIMIT_CHAT = float(os.environ.get('QUIZ_RATE_LIMIT_CHAT', '1'))
+RATE_LIMIT_CHAT_BURST = float(os.environ.get('QUIZ_RATE_LIMIT_CHAT_BURST', '5'))
+RATE_LIMIT_MAX_RETRIES = int(os.environ.get('QUIZ_RATE_LIMIT_MAX_RETRIES', '3'))
+
+# Background tasks deleting old question messages
+DELETION_WORKERS = int(os.environ.get('QUIZ_DELETION_WORKERS', '4'))
+
+# Public HTTPS URL Telegram should deliver updates to; empty keeps long polling
+WEBHOOK_URL = os.environ.get('QUIZ_WEBHOOK_URL', '')
+# Address and port the built-in webhook listener binds to, usually behind a TLS proxy
+WEBHOOK_LISTEN = os.environ.get('QUIZ_WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('QUIZ_WEBHOOK_PORT', '8080'))
+# Local path the listener accepts updates on
+WEBHOOK_PATH = os.environ.get('QUIZ_WEBHOOK_PATH', '/telegram')
+# Secret Telegram sends back with every update; a random one is generated per run if empty
+WEBHOOK_SECRET = os.environ.get('QUIZ_WEBHOOK_SECRET', '')
+
+# Connection pool for outgoing Bot API calls: size, how long idle connections are kept
+# alive, and the connect/read/write timeouts and the wait for a free connection, in seconds
+HTTP_POOL_SIZE = int(os.environ.get('QUIZ_HTTP_POOL_SIZE', '32'))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('QUIZ_HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('QUIZ_HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.environ.get('QUIZ_HTTP_READ_TIMEOUT', '5'))
+HTTP_WRITE_TIMEOUT = float(os.environ.get('QUIZ_HTTP_WRITE_TIMEOUT', '5'))
+HTTP_POOL_TIMEOUT = float(os.environ.get('QUIZ_HTTP_POOL_TIMEOUT', '3'))
+# Separate pool used only by getUpdates, so long polling never competes with sends
+GET_UPDATES_POOL_SIZE = int(os.environ.get('QUIZ_GET_UPDATES_POOL_SIZE', '1'))
+
+# Updates handled in parallel; updates from the same duel, or the same user outside
+# a duel, always run one after another
+UPDATE_CONCURRENCY = int(os.environ.get('QUIZ_UPDATE_CONCURRENCY', '64'))
+# Updates accepted from the queue before waiting for earlier ones to finish
+UPDATE_MAX_PENDING = int(os.environ.get('QUIZ_UPDATE_MAX_PENDING', '4096'))
+
+# Threads, each with its own read-only SQLite connection, serving database reads
+DB_READERS = int(os.environ.get('QUIZ_DB_READERS', '4'))
+# SQLite settings for quiz_bot.db: journal mode, fsync level, page cache (KiB), memory-mapped
+# I/O (bytes) and how long to wait on a locked database (ms)
+DB_JOURNAL_MODE = os.environ.get('QUIZ_DB_JOURNAL_MODE', 'wal')
+DB_SYNCHRONOUS = os.environ.get('QUIZ_DB_SYNCHRONOUS', 'normal')
+DB_CACHE_SIZE_KIB = int(os.environ.get('QUIZ_DB_CACHE_SIZE_KIB', '16384'))
+DB_MMAP_SIZE = int(os.environ.get('QUIZ_DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+DB_BUSY_TIMEOUT = int(os.environ.get('QUIZ_DB_BUSY_TIMEOUT', '5000'))
+# How often the WAL is checkpointed in the background, in seconds; 0 leaves it to SQLite's
+# automatic checkpoints, which run inside whichever commit crosses the threshold
+DB_CHECKPOINT_INTERVAL = float(os.environ.get('QUIZ_DB_CHECKPOINT_INTERVAL', '60'))
+
+# Registrations, profile changes and rating updates are written in one transaction once the
+# oldest is this many seconds old or this many have accumulated
+WRITE_BATCH_WINDOW = float(os.environ.get('QUIZ_WRITE_BATCH_WINDOW', '0.25'))
+WRITE_BATCH_MAX_OPS = int(os.environ.get('QUIZ_WRITE_BATCH_MAX_OPS', '500'))
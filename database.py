@@ -0,0 +1,203 @@
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import sqlite3
+import threading
+
+_STOP = object()
+
+
+class Database:
+    # SQLite access that keeps disk I/O off the event loop. A single writer
+    # thread owns the only write connection and runs writes in submission
+    # order, committing after each one; reads run on a small pool of threads,
+    # each with its own read-only connection. The async methods return as soon
+    # as the work is done without blocking the loop meanwhile, and the submit_*
+    # methods return concurrent futures for code that runs before the loop.
+    #
+    # With journal_mode='wal' readers never wait for the writer and commits
+    # append to the log instead of rewriting pages, so checkpoint() should be
+    # called periodically to fold the log back into the database.
+    #
+    # Writes are numbered in submission order (the future's `seq`), and
+    # read_snapshot() tells which of them a read saw, for callers that combine
+    # a read with writes still in flight.
+
+    def __init__(self, path, readers=4, journal_mode=None, synchronous=None, cache_size=None, mmap_size=None,
+                 busy_timeout=None, wal_autocheckpoint=None):
+        self._path = path
+        # Applied to every connection; the rest only concern the writer
+        self._shared_pragmas = _pragmas(cache_size=cache_size, mmap_size=mmap_size, busy_timeout=busy_timeout)
+        writer_pragmas = _pragmas(journal_mode=journal_mode, synchronous=synchronous, wal_autocheckpoint=wal_autocheckpoint)
+
+        # Opened here so a bad setting fails at startup rather than in the thread
+        self._conn = self._connect(path, writer_pragmas + self._shared_pragmas)
+        self._writes = queue.Queue()
+        self._write_seq = 0
+        # Held by the writer around each commit; `_committing` is the write
+        # being committed, `_committed` the last one that was
+        self._commit_lock = threading.Lock()
+        self._committing = 0
+        self._committed = 0
+        self._writer = threading.Thread(target=self._write_loop, name='db-writer', daemon=True)
+        self._writer.start()
+        self._local = threading.local()
+        self._readers = concurrent.futures.ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+        self._reader_connections = []
+        self._reader_lock = threading.Lock()
+
+        # Metrics
+        self.writes = 0
+        self.reads = 0
+        self.checkpoints = 0
+        self.last_checkpoint = None  # (busy, WAL pages, pages checkpointed)
+
+    @property
+    def write_backlog(self):
+        return self._writes.qsize()
+
+    @staticmethod
+    def _connect(database, pragmas, **kwargs):
+        conn = sqlite3.connect(database, check_same_thread=False, **kwargs)
+        for name, value in pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _write_loop(self):
+        conn = self._conn
+        try:
+            while True:
+                job = self._writes.get()
+                if job is _STOP:
+                    break
+                future, func, args, seq = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = func(conn, *args)
+                    with self._commit_lock:
+                        self._committing = seq
+                        try:
+                            conn.commit()
+                        finally:
+                            self._committed = seq
+                except Exception as e:
+                    conn.rollback()
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                self.writes += 1
+        finally:
+            conn.close()
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect(f'file:{self._path}?mode=ro', self._shared_pragmas, uri=True)
+            self._local.conn = conn
+            with self._reader_lock:
+                self._reader_connections.append(conn)
+        return conn
+
+    def _read(self, func, args):
+        return func(self._reader(), *args)
+
+    def _read_snapshot(self, func, args):
+        conn = self._reader()
+        while True:
+            committed = self._committed
+            conn.execute('BEGIN')
+            try:
+                result = func(conn, *args)
+            finally:
+                conn.rollback()
+            # Every write up to `committed` was visible to the read; if no later
+            # one had started committing by the end, none of those were
+            if self._committing == committed:
+                return result, committed
+            # Wait out the commit under way and read again
+            with self._commit_lock:
+                pass
+
+    def submit_write(self, func, *args):
+        # Runs func(conn, *args) on the writer thread inside one transaction
+        future = concurrent.futures.Future()
+        self._write_seq += 1
+        future.seq = self._write_seq
+        self._writes.put((future, func, args, future.seq))
+        return future
+
+    def submit_read(self, func, *args):
+        # Runs func(conn, *args) on a reader thread
+        self.reads += 1
+        return self._readers.submit(self._read, func, args)
+
+    async def write(self, func, *args):
+        return await asyncio.wrap_future(self.submit_write(func, *args))
+
+    async def read(self, func, *args):
+        return await asyncio.wrap_future(self.submit_read(func, *args))
+
+    async def read_snapshot(self, func, *args):
+        # Like read(), in one transaction, returning (result, seq): the read saw
+        # every write with a `seq` up to this one and none after it
+        self.reads += 1
+        return await asyncio.wrap_future(self._readers.submit(self._read_snapshot, func, args))
+
+    async def execute(self, sql, params=()):
+        # Returns the number of rows changed
+        return await self.write(_execute, sql, params)
+
+    async def executemany(self, sql, rows):
+        return await self.write(_executemany, sql, rows)
+
+    async def fetchone(self, sql, params=()):
+        return await self.read(_fetchone, sql, params)
+
+    async def fetchall(self, sql, params=()):
+        return await self.read(_fetchall, sql, params)
+
+    async def checkpoint(self, mode='PASSIVE'):
+        # Copies committed WAL pages back into the database file on the writer
+        # thread, between writes. PASSIVE never waits for readers.
+        self.last_checkpoint = await self.write(_checkpoint, mode)
+        self.checkpoints += 1
+        busy, wal_pages, checkpointed = self.last_checkpoint
+        logging.debug(f'WAL checkpoint ({mode}): {checkpointed} of {wal_pages} pages, busy={busy}')
+        return self.last_checkpoint
+
+    def close(self):
+        # Lets queued writes finish, then closes every connection
+        self._writes.put(_STOP)
+        self._writer.join()
+        self._readers.shutdown(wait=True)
+        with self._reader_lock:
+            for conn in self._reader_connections:
+                conn.close()
+            self._reader_connections.clear()
+        logging.info(f'Database closed after {self.writes} writes and {self.reads} reads')
+
+
+def _pragmas(**values):
+    return [(name, value) for name, value in values.items() if value is not None]
+
+
+def _checkpoint(conn, mode):
+    return conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).rowcount
+
+
+def _executemany(conn, sql, rows):
+    return conn.executemany(sql, rows).rowcount
+
+
+def _fetchone(conn, sql, params):
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(conn, sql, params):
+    return conn.execute(sql, params).fetchall()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from ratelimit import PRIORITY_LOW
+
+
+class DeletionQueue:
+    # Deletes messages in the background so cleanup never sits on the path to
+    # the next question. Repeated deletes of the same message are coalesced,
+    # transient failures are retried with exponential backoff through the
+    # shared scheduler, and messages that are already gone are dropped quietly.
+
+    def __init__(self, scheduler, workers=4, max_attempts=5, backoff=1.0):
+        self._scheduler = scheduler
+        self._worker_count = workers
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._queue = asyncio.Queue()
+        self._pending = {}  # (chat_id, message_id) -> attempts made so far
+        self._workers = []
+        self._bot = None
+
+        # Metrics
+        self.deleted = 0
+        self.gone = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self, bot):
+        self._bot = bot
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._work()) for _ in range(self._worker_count)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def schedule(self, chat_id, message_id):
+        # Returns False if the message was already waiting to be deleted
+        key = (chat_id, message_id)
+        if key in self._pending:
+            self.coalesced += 1
+            return False
+        self._pending[key] = 0
+        self._queue.put_nowait(key)
+        return True
+
+    async def _work(self):
+        while True:
+            key = await self._queue.get()
+            try:
+                await self._delete(key)
+            finally:
+                self._queue.task_done()
+
+    async def _delete(self, key):
+        chat_id, message_id = key
+        try:
+            await self._bot.delete_message(chat_id=chat_id, message_id=message_id, rate_limit_args=PRIORITY_LOW)
+        except BadRequest as e:
+            # "Message to delete not found", too old to delete, ...: nothing to retry
+            del self._pending[key]
+            self.gone += 1
+            logging.debug(f'Message {message_id} in chat {chat_id} not deleted: {e}')
+        except Forbidden as e:
+            del self._pending[key]
+            self.gone += 1
+            logging.debug(f'Message {message_id} in chat {chat_id} not deleted: {e}')
+        except (NetworkError, RetryAfter) as e:
+            attempts = self._pending[key] + 1
+            if attempts >= self._max_attempts:
+                del self._pending[key]
+                self.failed += 1
+                logging.warning(f'Giving up deleting message {message_id} in chat {chat_id} after {attempts} attempts: {e}')
+                return
+            self._pending[key] = attempts
+            self.retried += 1
+            delay = e.retry_after if isinstance(e, RetryAfter) else self._backoff * 2 ** (attempts - 1)
+            self._scheduler.call_later(delay, self._queue.put_nowait, key)
+        except Exception:
+            del self._pending[key]
+            self.failed += 1
+            logging.exception(f'Failed to delete message {message_id} in chat {chat_id}')
+        else:
+            del self._pending[key]
+            self.deleted += 1
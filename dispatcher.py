@@ -0,0 +1,68 @@
+import asyncio
+
+from telegram.ext import Application
+
+
+class KeyedDispatcher:
+    # Runs work concurrently while keeping work with the same key in arrival
+    # order. Every key has a chain of futures, and each job waits for the one
+    # queued before it under that key. Only running jobs count against the
+    # concurrency limit, so a busy key doesn't tie up slots other keys could use.
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._slots = asyncio.Semaphore(limit)
+        self._tails = {}  # key -> future resolved when the last queued job for it ends
+
+        # Metrics
+        self.processed = 0
+        self.running = 0
+        self.peak_running = 0
+        self.queued_behind_key = 0
+
+    @property
+    def busy_keys(self):
+        return len(self._tails)
+
+    async def run(self, key, func, *args):
+        # Awaits func(*args) once every earlier job with the same key has
+        # finished; a key of None means the job has no ordering constraints
+        done = previous = None
+        if key is not None:
+            previous = self._tails.get(key)
+            done = asyncio.get_running_loop().create_future()
+            self._tails[key] = done
+
+        try:
+            if previous is not None:
+                self.queued_behind_key += 1
+                await asyncio.wait((previous,))
+            async with self._slots:
+                self.running += 1
+                self.peak_running = max(self.peak_running, self.running)
+                try:
+                    return await func(*args)
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            if done is not None:
+                done.set_result(None)
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+
+class KeyedApplication(Application):
+    # Application that hands every update to a KeyedDispatcher. concurrent_updates
+    # on the builder then only bounds how many updates may be pending at once;
+    # the dispatcher decides what actually runs in parallel.
+
+    __slots__ = ('dispatcher', 'update_key')
+
+    def __init__(self, dispatcher, update_key, **kwargs):
+        super().__init__(**kwargs)
+        self.dispatcher = dispatcher
+        self.update_key = update_key
+
+    async def process_update(self, update):
+        await self.dispatcher.run(self.update_key(update), super().process_update, update)
@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+
+
+class DuelIdAllocator:
+    # Hands out monotonically increasing duel ids. Ids are never reused, so a
+    # finished duel can't hand its id to a new one while stale callbacks for it
+    # are still in flight.
+
+    def __init__(self, start=1):
+        self._counter = itertools.count(start)
+
+    def allocate(self):
+        return next(self._counter)
+
+
+class Duel:
+    # Compact record for one live duel. Per-player state is stored in paired
+    # slots instead of nested dicts/sets; `attempted` is a bitmask with bit 1
+    # for user1 and bit 2 for user2.
+
+    __slots__ = (
+        'duel_id',
+        'user1_id',
+        'user2_id',
+        'questions',
+        'current_question',
+        'score1',
+        'score2',
+        'answered',
+        'attempted',
+        'message1_id',
+        'message2_id',
+        'question_deadline',
+        'expiry',
+        'round_result',
+        'api_calls',
+        '_lock',
+    )
+
+    def __init__(self, duel_id, user1_id, user2_id, questions):
+        self.duel_id = duel_id
+        self.user1_id = user1_id
+        self.user2_id = user2_id
+        self.questions = questions
+        self.current_question = 0
+        self.score1 = 0
+        self.score2 = 0
+        self.answered = False
+        self.attempted = 0
+        self.message1_id = None
+        self.message2_id = None
+        self.question_deadline = None
+        self.expiry = None
+        self.round_result = None  # (outcome, scorer id, scorer name) awaiting display in board mode
+        self.api_calls = 0
+        self._lock = None
+
+    def __repr__(self):
+        return f'Duel(duel_id={self.duel_id}, user1_id={self.user1_id}, user2_id={self.user2_id})'
+
+    @property
+    def lock(self):
+        # Serializes every read-modify-write of this duel across awaits.
+        # Created on first use so idle duels don't pay for it.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def players(self):
+        return (self.user1_id, self.user2_id)
+
+    def _bit(self, user_id):
+        return 1 if user_id == self.user1_id else 2
+
+    def current(self):
+        if self.current_question < len(self.questions):
+            return self.questions[self.current_question]
+        return None
+
+    def opponent_of(self, user_id):
+        return self.user2_id if user_id == self.user1_id else self.user1_id
+
+    def has_attempted(self, user_id):
+        return bool(self.attempted & self._bit(user_id))
+
+    def mark_attempted(self, user_id):
+        self.attempted |= self._bit(user_id)
+
+    def all_attempted(self):
+        return self.attempted == 3
+
+    def reset_round(self):
+        self.answered = False
+        self.attempted = 0
+
+    def add_point(self, user_id):
+        if user_id == self.user1_id:
+            self.score1 += 1
+        else:
+            self.score2 += 1
+
+    def cancel_question_deadline(self):
+        if self.question_deadline is not None:
+            self.question_deadline.cancel()
+            self.question_deadline = None
+
+    def cancel_timers(self):
+        self.cancel_question_deadline()
+        if self.expiry is not None:
+            self.expiry.cancel()
+            self.expiry = None
+
+    def message_id_for(self, user_id):
+        return self.message1_id if user_id == self.user1_id else self.message2_id
+
+    def clear_message_ids(self):
+        self.message1_id = None
+        self.message2_id = None
+
+    def message_ids(self):
+        # (chat_id, message_id) pairs for the question messages still on screen
+        return [(uid, mid) for uid, mid in ((self.user1_id, self.message1_id), (self.user2_id, self.message2_id)) if mid]
+
+
+class DuelRegistry:
+    # Live duels keyed by duel id, plus a user id -> duel id reverse index
+    # that is kept in sync on add/remove so lookups by either key are O(1).
+
+    def __init__(self):
+        self._duels = {}
+        self._duel_by_user = {}
+
+    def __len__(self):
+        return len(self._duels)
+
+    def __contains__(self, duel_id):
+        return duel_id in self._duels
+
+    def add(self, duel):
+        if duel.duel_id in self._duels:
+            raise ValueError(f'Duel {duel.duel_id} already exists')
+        for user_id in duel.players:
+            if user_id in self._duel_by_user:
+                raise ValueError(f'User {user_id} is already in duel {self._duel_by_user[user_id]}')
+        self._duels[duel.duel_id] = duel
+        self._duel_by_user[duel.user1_id] = duel.duel_id
+        self._duel_by_user[duel.user2_id] = duel.duel_id
+
+    def get(self, duel_id):
+        return self._duels.get(duel_id)
+
+    def duel_id_for_user(self, user_id):
+        return self._duel_by_user.get(user_id)
+
+    def get_by_user(self, user_id):
+        duel_id = self._duel_by_user.get(user_id)
+        if duel_id is None:
+            return None
+        return self._duels[duel_id]
+
+    def is_playing(self, user_id):
+        return user_id in self._duel_by_user
+
+    def remove(self, duel_id):
+        duel = self._duels.pop(duel_id, None)
+        if duel is None:
+            return None
+        for user_id in duel.players:
+            if self._duel_by_user.get(user_id) == duel_id:
+                del self._duel_by_user[user_id]
+        return duel
@@ -0,0 +1,27 @@
+import asyncio
+import logging
+
+
+async def fan_out(calls):
+    # `calls` is a list of (chat_id, awaitable) pairs. Calls for different
+    # chats run concurrently, calls for the same chat run one after another in
+    # list order. A failing call is logged and its exception is returned in
+    # its slot; it never cancels or skips the other calls.
+    results = [None] * len(calls)
+    by_chat = {}
+    for index, (chat_id, call) in enumerate(calls):
+        by_chat.setdefault(chat_id, []).append((index, call))
+
+    async def run_chat(chat_id, chat_calls):
+        for index, call in chat_calls:
+            try:
+                results[index] = await call
+            except Exception as e:
+                logging.warning(f'Bot API call for chat {chat_id} failed: {e}')
+                results[index] = e
+
+    if len(by_chat) == 1:
+        await run_chat(*next(iter(by_chat.items())))
+    else:
+        await asyncio.gather(*(run_chat(chat_id, chat_calls) for chat_id, chat_calls in by_chat.items()))
+    return results
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+
+import import_questions
+from questions import QuestionStore
+
+
+def _sync_in_worker(live_store, db_path, path):
+    # Runs in a worker thread with its own connection, so parsing, validation
+    # and the write transaction never touch the event loop. The result is
+    # swapped into the live store here too, as that waits for any sample in
+    # progress.
+    store = QuestionStore(db_path)
+    try:
+        stats = import_questions.sync_file(store, path)
+        stats['max_id'], stats['count'] = store.bounds()
+    finally:
+        store.close()
+    live_store.apply_reload(stats['max_id'], stats['count'], stats['deleted_ids'])
+    return stats
+
+
+class QuestionReloader:
+    # Reloads the question file into the live QuestionStore when it changes.
+    # Duels hold the Question objects they sampled, so a reload never affects
+    # games in progress.
+
+    def __init__(self, store, db_path, path):
+        self._store = store
+        self._db_path = db_path
+        self._path = path
+        self._signature = self._stat()
+        self._lock = asyncio.Lock()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    async def check(self):
+        if self._stat() != self._signature and not self._lock.locked():
+            await self.reload()
+
+    async def reload(self):
+        async with self._lock:
+            signature = self._stat()
+            try:
+                stats = await asyncio.to_thread(_sync_in_worker, self._store, self._db_path, self._path)
+            except Exception:
+                # Don't retry a broken file on every check; wait for the next edit
+                self._signature = signature
+                raise
+            self._signature = signature
+            logging.info(
+                f"Reloaded {self._path}: {stats['inserted']} added, {stats['deleted']} removed, "
+                f"{stats['invalid']} invalid, {stats['count']} questions in {stats['seconds']:.2f}s"
+            )
+            return stats
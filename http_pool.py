@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+
+
+class InstrumentedRequest(HTTPXRequest):
+    # HTTPXRequest with a configurable keep-alive expiry and a record of how
+    # long requests wait for a free connection. Requests pass a semaphore the
+    # size of the pool before reaching httpx, so the time spent there is the
+    # pool wait and httpx never blocks on the pool itself.
+
+    def __init__(self, name, connection_pool_size, keepalive_expiry=None, **kwargs):
+        self.name = name
+        self.pool_size = connection_pool_size
+        self._keepalive_expiry = keepalive_expiry
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+        self._slots = asyncio.Semaphore(connection_pool_size)
+
+        # Metrics
+        self.requests = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.pool_timeouts = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _build_client(self):
+        self._client_kwargs['limits'] = httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=self._keepalive_expiry,
+        )
+        return super()._build_client()
+
+    async def do_request(
+        self,
+        url,
+        method,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ):
+        timeout = self._client.timeout.pool if pool_timeout is BaseRequest.DEFAULT_NONE else pool_timeout
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.pool_timeouts += 1
+            raise TimedOut(
+                f'Pool timeout: all {self.pool_size} connections of the {self.name} pool are busy. '
+                'Request was *not* sent to Telegram.'
+            )
+
+        wait = time.monotonic() - started
+        self.requests += 1
+        if wait > 0.001:
+            self.waited += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await super().do_request(
+                url,
+                method,
+                request_data=request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            'pool_size': self.pool_size,
+            'requests': self.requests,
+            'waited': self.waited,
+            'average_wait': self.total_wait / self.requests if self.requests else 0.0,
+            'max_wait': self.max_wait,
+            'pool_timeouts': self.pool_timeouts,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+        }
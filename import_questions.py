@@ -0,0 +1,237 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import time
+
+import callbacks
+from questions import QuestionStore, question_hash
+
+MIN_OPTIONS = 2
+MAX_OPTIONS = 8
+# Leaves room for the 'Question N: ' prefix within Telegram's 4096 character limit
+MAX_QUESTION_LENGTH = 4000
+# Largest question and duel ids the callback payload has to carry (SQLite rowids are 64-bit)
+MAX_QUESTION_ID = 2**63 - 1
+MAX_DUEL_ID = 2**63 - 1
+# CSV columns holding one option each
+OPTION_COLUMN = re.compile(r'option(\d+)')
+# A duel asks 3 questions; a sync must not leave the bank with fewer
+MIN_QUESTIONS = 3
+
+FORMATS = {'.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv'}
+
+# A payload's size only depends on these bounds, so one check covers every
+# button of every question that passes validate()
+callbacks.encode_answer(MAX_DUEL_ID, MAX_QUESTION_ID, MAX_OPTIONS - 1)
+
+
+class InvalidQuestion(ValueError):
+    pass
+
+
+def iter_json_array(file, chunk_size=1 << 16):
+    # Yields the elements of a top-level JSON array without holding the whole
+    # document in memory: elements are decoded one at a time from a buffer
+    # that only ever holds the current element plus one chunk.
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace, the opening bracket and separators
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+            if buffer[position] == '[':
+                if started:
+                    break
+                started = True
+            elif buffer[position] == ',' and not started:
+                break
+            position += 1
+        if position < len(buffer) and not started:
+            raise json.JSONDecodeError('Expected a top-level array', buffer, position)
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        if position < len(buffer) and started:
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number cut at the chunk boundary still decodes; only accept
+                # an element once the character after it is visible
+                if eof or (end < len(buffer) and buffer[end] in ' \t\r\n,]'):
+                    yield element
+                    position = end
+                    continue
+        if eof:
+            if started:
+                raise json.JSONDecodeError('Unterminated array', buffer, position)
+            raise json.JSONDecodeError('Expected a top-level array', buffer, position)
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_jsonl(file):
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_csv(file):
+    # Options come either from an `options` column (a JSON array or values
+    # separated by '|') or from option1, option2, ... columns.
+    reader = csv.DictReader(file)
+    numbered = []
+    for name in reader.fieldnames or ():
+        if name.startswith('option') and name != 'options':
+            match = OPTION_COLUMN.fullmatch(name)
+            if match is None:
+                raise ValueError(f'Unexpected CSV column {name!r}; expected options or option1, option2, ...')
+            numbered.append((int(match[1]), name))
+    option_columns = [name for _, name in sorted(numbered)]
+    for row in reader:
+        options = row.get('options')
+        if options:
+            options = json.loads(options) if options.lstrip().startswith('[') else options.split('|')
+        else:
+            options = [row[key] for key in option_columns if row[key]]
+        yield {
+            'question': row.get('question'),
+            'options': options,
+            'answer': row.get('answer'),
+            'category': row.get('category') or None,
+            'difficulty': row.get('difficulty') or None,
+            'language': row.get('language') or None,
+        }
+
+
+def validate(question_data):
+    # Returns the record as a row for the questions table, or raises InvalidQuestion
+    if not isinstance(question_data, dict):
+        raise InvalidQuestion('record is not an object')
+    question = question_data.get('question')
+    options = question_data.get('options')
+    answer = question_data.get('answer')
+
+    if not isinstance(question, str) or not question.strip():
+        raise InvalidQuestion('missing question text')
+    if len(question) > MAX_QUESTION_LENGTH:
+        raise InvalidQuestion(f'question is longer than {MAX_QUESTION_LENGTH} characters')
+    if not isinstance(options, list) or not all(isinstance(option, str) and option.strip() for option in options):
+        raise InvalidQuestion('options must be a list of non-empty strings')
+    if not MIN_OPTIONS <= len(options) <= MAX_OPTIONS:
+        raise InvalidQuestion(f'expected {MIN_OPTIONS}-{MAX_OPTIONS} options, got {len(options)}')
+    if len(set(options)) != len(options):
+        raise InvalidQuestion('options are not unique')
+    if answer not in options:
+        raise InvalidQuestion(f'answer {answer!r} is not among the options')
+
+    difficulty = question_data.get('difficulty')
+    if difficulty is not None:
+        try:
+            difficulty = int(difficulty)
+        except (TypeError, ValueError):
+            raise InvalidQuestion(f'difficulty {difficulty!r} is not an integer')
+    for field in ('category', 'language'):
+        value = question_data.get(field)
+        if value is not None and not isinstance(value, str):
+            raise InvalidQuestion(f'{field} {value!r} is not a string')
+
+    return (
+        question,
+        json.dumps(options, ensure_ascii=False),
+        answer,
+        question_data.get('category'),
+        difficulty,
+        question_data.get('language'),
+        question_hash(question, options, answer),
+    )
+
+
+def iter_valid_rows(path, file_format, stats):
+    # Streams validated rows from `path`, counting read/invalid records in `stats`
+    file_format = file_format or FORMATS.get(os.path.splitext(path)[1].lower())
+    if file_format is None:
+        raise ValueError(f'Cannot tell the format of {path}; pass one of {sorted(set(FORMATS.values()))}')
+    readers = {'json': iter_json_array, 'jsonl': iter_jsonl, 'csv': iter_csv}
+
+    with open(path, 'r', encoding='utf-8', newline='' if file_format == 'csv' else None) as file:
+        for question_data in readers[file_format](file):
+            stats['read'] += 1
+            try:
+                yield validate(question_data)
+            except InvalidQuestion as e:
+                stats['invalid'] += 1
+                logging.warning(f'{path}: record {stats["read"]} skipped: {e}')
+
+
+def import_file(store, path, file_format=None, batch_size=5000):
+    # Streams `path` into `store`, committing every `batch_size` rows.
+    # Returns a stats dict with read/inserted/duplicates/invalid/seconds.
+    stats = {'read': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0}
+    started = time.perf_counter()
+    batch = []
+    for row in iter_valid_rows(path, file_format, stats):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            stats['inserted'] += store.insert_many(batch)
+            batch = []
+    if batch:
+        stats['inserted'] += store.insert_many(batch)
+
+    stats['duplicates'] = stats['read'] - stats['invalid'] - stats['inserted']
+    stats['seconds'] = time.perf_counter() - started
+    store.refresh()
+    return stats
+
+
+def sync_file(store, path, source=None, file_format=None, min_questions=MIN_QUESTIONS):
+    # Makes the questions imported from `path` match its current content.
+    # Parsing and validation happen before the (single) write transaction,
+    # and a file with any invalid record is rejected as a whole, as is one
+    # without valid records or a sync leaving fewer than `min_questions`.
+    # The store's in-memory state is left alone; see QuestionStore.apply_reload.
+    stats = {'read': 0, 'inserted': 0, 'deleted': 0, 'invalid': 0}
+    started = time.perf_counter()
+    rows = list(iter_valid_rows(path, file_format, stats))
+    if stats['invalid']:
+        # All or nothing: a half-edited file must not delete questions
+        raise ValueError(f"{path} has {stats['invalid']} invalid records, not syncing")
+    if not rows:
+        # An empty or truncated file would otherwise delete every question it owns
+        raise ValueError(f'{path} has no questions, not syncing')
+    stats['inserted'], stats['deleted_ids'] = store.sync_rows(rows, source or os.path.basename(path), min_questions)
+    stats['deleted'] = len(stats['deleted_ids'])
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import questions into the quiz bot database.')
+    parser.add_argument('path', help='JSON array, JSONL or CSV file')
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())), help='input format (default: from the file extension)')
+    parser.add_argument('--db', default='quiz_bot.db', help='SQLite database (default: quiz_bot.db)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per transaction (default: 5000)')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    store = QuestionStore(args.db)
+    store.init_schema()
+    stats = import_file(store, args.path, args.format, args.batch_size)
+    rate = stats['read'] / stats['seconds'] if stats['seconds'] else 0
+    print(
+        'read {read}, inserted {inserted}, duplicates {duplicates}, invalid {invalid} '
+        'in {seconds:.2f}s ({rate:.0f} rows/sec)'.format(rate=rate, **stats)
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+class Leaderboard:
+    # Top `size` users by rating, kept in memory and updated as ratings change,
+    # with the rendered text cached until the top list itself changes.
+    #
+    # Besides the top entries it tracks some `slack` candidates below them, and
+    # a floor: every user it doesn't track has a rating of at most the floor.
+    # A user rising above the floor is picked up; a tracked user sinking below
+    # it is dropped. Only if too many drop out does it need reloading from the
+    # database (needs_reload). Updates carry absolute ratings, so the ones that
+    # arrive while a reload is in flight are simply replayed on top of it.
+
+    def __init__(self, render, size=10, slack=50):
+        self.size = size
+        self._slack = slack
+        self._render = render
+        self._entries = {}  # user_id -> (rating, username)
+        self._floor = None  # None while every user is tracked
+        self._top = ()
+        self._text = None
+        self._replay = None
+
+        # Metrics
+        self.renders = 0
+        self.reloads = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def load_limit(self):
+        # Rows to pass to load(): the top users by rating, best first
+        return self.size + self._slack
+
+    @property
+    def needs_reload(self):
+        return self._floor is not None and len(self._entries) < self.size and self._replay is None
+
+    def load(self, rows):
+        # rows: (user_id, username, rating), best first, at most load_limit of them
+        self._entries = {user_id: (rating, username) for user_id, username, rating in rows}
+        self._floor = rows[-1][2] if len(rows) >= self.load_limit else None
+        self._refresh()
+
+    def begin_reload(self):
+        self._replay = []
+
+    def finish_reload(self, rows):
+        replay, self._replay = self._replay, None
+        self.reloads += 1
+        self.load(rows)
+        for user_id, rating, username in replay:
+            self.update(user_id, rating, username)
+
+    def cancel_reload(self):
+        self._replay = None
+
+    def update(self, user_id, rating, username=None):
+        if self._replay is not None:
+            self._replay.append((user_id, rating, username))
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if self._floor is not None and rating < self._floor:
+                del self._entries[user_id]
+            else:
+                self._entries[user_id] = (rating, entry[1] if username is None else username)
+        elif self._floor is None or rating > self._floor:
+            self._entries[user_id] = (rating, username)
+        else:
+            return
+        self._trim()
+        self._refresh()
+
+    def rename(self, user_id, username):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] != username:
+            self._entries[user_id] = (entry[0], username)
+            self._refresh()
+
+    def _trim(self):
+        # Forget the lowest candidates once too many have climbed above the floor
+        if len(self._entries) <= self.size + 2 * self._slack:
+            return
+        ranked = sorted(self._entries.items(), key=lambda item: (item[1][0], -item[0]))
+        dropped = ranked[:len(ranked) - self.load_limit]
+        for user_id, _ in dropped:
+            del self._entries[user_id]
+        highest_dropped = dropped[-1][1][0]
+        self._floor = highest_dropped if self._floor is None else max(self._floor, highest_dropped)
+
+    def _refresh(self):
+        ranked = sorted(self._entries.items(), key=lambda item: (-item[1][0], item[0]))
+        top = tuple((user_id, rating, username) for user_id, (rating, username) in ranked[:self.size])
+        if top != self._top:
+            self._top = top
+            self._text = None
+
+    def text(self):
+        if self._text is None:
+            self._text = self._render([(username, rating) for _, rating, username in self._top])
+            self.renders += 1
+        return self._text
@@ -0,0 +1,37 @@
+from collections import OrderedDict
+
+
+class MatchmakingQueue:
+    # FIFO queue of users waiting for an opponent. An OrderedDict keeps the
+    # arrival order and doubles as the membership index, so enqueue, dequeue,
+    # membership checks and removal are all O(1).
+
+    def __init__(self):
+        self._waiting = OrderedDict()
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def __bool__(self):
+        return bool(self._waiting)
+
+    def __contains__(self, user_id):
+        return user_id in self._waiting
+
+    def enqueue(self, user_id):
+        if user_id in self._waiting:
+            return False
+        self._waiting[user_id] = None
+        return True
+
+    def dequeue(self):
+        if not self._waiting:
+            return None
+        user_id, _ = self._waiting.popitem(last=False)
+        return user_id
+
+    def remove(self, user_id):
+        if user_id not in self._waiting:
+            return False
+        del self._waiting[user_id]
+        return True
@@ -0,0 +1,48 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+class Profile(NamedTuple):
+    username: Optional[str]
+    first_name: Optional[str]
+
+    @property
+    def display_name(self):
+        return self.username or self.first_name
+
+
+class ProfileCache:
+    # TTL + LRU cache of user names, so showing a name doesn't need a
+    # get_chat round-trip. Entries are refreshed for free from every incoming
+    # update; `hits` and `misses` count lookups.
+
+    def __init__(self, max_size=100000, ttl=3600):
+        self._entries = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            profile, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return profile
+            del self._entries[user_id]
+        self.misses += 1
+        return None
+
+    def put(self, user_id, profile):
+        # Returns True when the profile is new to the cache or has changed
+        entry = self._entries.pop(user_id, None)
+        self._entries[user_id] = (profile, time.monotonic() + self._ttl)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+        return entry is None or entry[0] != profile
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import NamedTuple, Tuple
+
+import callbacks
+
+
+class Question(NamedTuple):
+    # Immutable, ready-to-send question. The option texts are kept JSON-encoded,
+    # so sending a question neither constructs buttons nor re-encodes the
+    # markup; only the signed payloads, which name the duel, are filled in.
+    question_id: int
+    text: str
+    options: Tuple[str, ...]
+    answer_index: int
+    options_json: Tuple[str, ...]
+
+    def reply_markup_json(self, duel_id):
+        # The inline keyboard as PTB would serialize it, with payloads for `duel_id`
+        buttons = ','.join(
+            f'[{{"callback_data":"{callbacks.encode_answer(duel_id, self.question_id, option_index)}","text":{option_json}}}]'
+            for option_index, option_json in enumerate(self.options_json)
+        )
+        return f'{{"inline_keyboard":[{buttons}]}}'
+
+
+def compile_question(question_id, question_data):
+    options = tuple(question_data['options'])
+    answer_index = options.index(question_data['answer'])
+    options_json = tuple(json.dumps(option, ensure_ascii=False) for option in options)
+    return Question(question_id, question_data['question'], options, answer_index, options_json)
+
+
+def question_hash(question, options, answer):
+    # Content hash used to deduplicate imports
+    content = json.dumps([question, options, answer], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+class QuestionStore:
+    # Question bank kept in an indexed SQLite table. Questions are sampled by
+    # random rowid and compiled on demand, with a bounded LRU of the hot ones,
+    # so memory use and startup time don't grow with the size of the bank.
+    # Filtered samples pick from the ids matching the filter, kept as compact
+    # arrays for the most recently used filters.
+    # Since sampling may query SQLite, it is meant to run in a worker thread;
+    # a lock keeps the LRU and id range consistent with a concurrent reload.
+
+    # Rounds of random rowid probing before falling back to ORDER BY RANDOM()
+    MAX_SAMPLE_ROUNDS = 16
+    # Attempts at a sample whose questions a concurrent sync keeps deleting
+    MAX_SAMPLE_ATTEMPTS = 3
+    # Filters whose matching ids are kept for sampling (8 bytes per id)
+    MAX_FILTER_LISTS = 32
+
+    def __init__(self, path, cache_size=4096):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._max_id = 0
+        self._count = 0
+        self._filtered_ids = OrderedDict()  # (where, params) -> array of matching ids
+        self._lock = threading.Lock()
+
+    def init_schema(self):
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS questions (
+                question_id INTEGER PRIMARY KEY,
+                question TEXT NOT NULL,
+                options TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                category TEXT,
+                difficulty INTEGER,
+                language TEXT,
+                content_hash TEXT,
+                source TEXT
+            )
+        ''')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(questions)')}
+        if 'content_hash' not in columns:
+            self._conn.execute('ALTER TABLE questions ADD COLUMN content_hash TEXT')
+            rows = self._conn.execute('SELECT question_id, question, options, answer FROM questions').fetchall()
+            self._conn.executemany(
+                'UPDATE questions SET content_hash = ? WHERE question_id = ?',
+                ((question_hash(text, json.loads(options), answer), question_id) for question_id, text, options, answer in rows),
+            )
+        if 'source' not in columns:
+            self._conn.execute('ALTER TABLE questions ADD COLUMN source TEXT')
+        self._conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_questions_filters
+            ON questions (language, category, difficulty)
+        ''')
+        self._conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_content_hash
+            ON questions (content_hash)
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_source ON questions (source)')
+        self._conn.commit()
+        self.refresh()
+
+    def close(self):
+        self._conn.close()
+
+    def bounds(self):
+        return self._conn.execute('SELECT COALESCE(MAX(question_id), 0), COUNT(*) FROM questions').fetchone()
+
+    def refresh(self):
+        # Re-read the id range after the table was changed outside this store
+        with self._lock:
+            self._max_id, self._count = self.bounds()
+            self._filtered_ids.clear()
+            self._cache.clear()
+
+    def apply_reload(self, max_id, count, deleted_ids):
+        # Swap in the result of a reload done through another connection.
+        # Unchanged questions keep their ids, so only deleted ones leave the LRU.
+        with self._lock:
+            for question_id in deleted_ids:
+                self._cache.pop(question_id, None)
+            self._max_id = max_id
+            self._count = count
+            self._filtered_ids.clear()
+
+    def __len__(self):
+        return self._count
+
+    def insert_many(self, rows, source=None):
+        # Inserts validated rows in one transaction, skipping content already
+        # in the table; returns the number of rows actually inserted
+        before = self._conn.total_changes
+        with self._conn:
+            self._insert(rows, source)
+        return self._conn.total_changes - before
+
+    def sync_rows(self, rows, source, min_count=0):
+        # Makes the questions owned by `source` match `rows` in one transaction:
+        # new content is inserted, content no longer present is deleted and
+        # unchanged questions keep their ids. Returns (inserted, deleted_ids).
+        # Rolls back with ValueError if fewer than `min_count` questions remain.
+        hashes = {row[-1] for row in rows}
+        with self._conn:
+            before = self._conn.total_changes
+            self._insert(rows, source)
+            inserted = self._conn.total_changes - before
+            # Adopt matching questions that were loaded before sources were tracked
+            self._conn.executemany(
+                'UPDATE questions SET source = ? WHERE content_hash = ? AND source IS NULL',
+                ((source, content_hash) for content_hash in hashes),
+            )
+            deleted_ids = [
+                question_id
+                for question_id, content_hash in self._conn.execute(
+                    'SELECT question_id, content_hash FROM questions WHERE source = ?', (source,)
+                )
+                if content_hash not in hashes
+            ]
+            self._conn.executemany('DELETE FROM questions WHERE question_id = ?', ((question_id,) for question_id in deleted_ids))
+            count = self._conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+            if count < min_count:
+                raise ValueError(f'Syncing {source} would leave {count} questions, need at least {min_count}')
+        return inserted, deleted_ids
+
+    def _insert(self, rows, source):
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO questions (question, options, answer, category, difficulty, language, content_hash, source) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (row + (source,) for row in rows),
+        )
+
+    def get(self, question_id):
+        with self._lock:
+            return self._load([question_id]).get(question_id)
+
+    def sample(self, k, category=None, difficulty=None, language=None):
+        filters = {'category': category, 'difficulty': difficulty, 'language': language}
+        filters = {column: value for column, value in filters.items() if value is not None}
+        with self._lock:
+            for _ in range(self.MAX_SAMPLE_ATTEMPTS):
+                if filters:
+                    question_ids = self._sample_filtered_ids(k, filters)
+                else:
+                    question_ids = self._sample_ids(k)
+                loaded = self._load(question_ids)
+                # A sync on another connection may delete picked ids before the
+                # reload reaches this store; pick again then
+                if len(loaded) == k:
+                    return [loaded[question_id] for question_id in question_ids]
+        raise ValueError(f'Could not sample {k} questions while the bank is being reloaded')
+
+    def _sample_ids(self, k):
+        if self._count < k:
+            raise ValueError(f'Need {k} questions, the bank has {self._count}')
+
+        # Probe random rowids; ids deleted from the table are simply missed
+        chosen = []
+        for _ in range(self.MAX_SAMPLE_ROUNDS):
+            wanted = k - len(chosen)
+            candidates = set(random.sample(range(1, self._max_id + 1), min(2 * wanted, self._max_id)))
+            candidates.difference_update(chosen)
+            found = list(self._load(candidates))
+            random.shuffle(found)
+            chosen.extend(found[:wanted])
+            if len(chosen) == k:
+                return chosen
+
+        # Very sparse id range: let SQLite pick from what actually exists
+        placeholders = ','.join('?' * len(chosen))
+        rows = self._conn.execute(
+            f'SELECT question_id FROM questions WHERE question_id NOT IN ({placeholders}) ORDER BY RANDOM() LIMIT ?',
+            (*chosen, k - len(chosen)),
+        ).fetchall()
+        return chosen + [row[0] for row in rows]
+
+    def _sample_filtered_ids(self, k, filters):
+        where = ' AND '.join(f'{column} = ?' for column in filters)
+        params = tuple(filters.values())
+        key = (where, params)
+        question_ids = self._filtered_ids.get(key)
+        if question_ids is None:
+            # One pass over the filter index, then every sample is O(k)
+            question_ids = array('q', (row[0] for row in self._conn.execute(f'SELECT question_id FROM questions WHERE {where}', params)))
+            self._filtered_ids[key] = question_ids
+            if len(self._filtered_ids) > self.MAX_FILTER_LISTS:
+                self._filtered_ids.popitem(last=False)
+        else:
+            self._filtered_ids.move_to_end(key)
+        if len(question_ids) < k:
+            raise ValueError(f'Need {k} questions matching {filters}, the bank has {len(question_ids)}')
+        return random.sample(question_ids, k)
+
+    def _load(self, question_ids):
+        # Returns {question_id: Question} for the ids that exist, serving hot
+        # questions from the LRU and fetching the rest in one query
+        loaded = {}
+        missing = []
+        for question_id in question_ids:
+            question = self._cache.get(question_id)
+            if question is None:
+                missing.append(question_id)
+            else:
+                self._cache.move_to_end(question_id)
+                loaded[question_id] = question
+
+        if missing:
+            placeholders = ','.join('?' * len(missing))
+            rows = self._conn.execute(
+                f'SELECT question_id, question, options, answer FROM questions WHERE question_id IN ({placeholders})',
+                missing,
+            ).fetchall()
+            for question_id, text, options, answer in rows:
+                question = compile_question(question_id, {'question': text, 'options': json.loads(options), 'answer': answer})
+                loaded[question_id] = question
+                self._cache[question_id] = question
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return loaded
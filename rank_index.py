@@ -0,0 +1,84 @@
+class RatingRankIndex:
+    # Number of users at every integer rating, kept in a Fenwick tree so a
+    # rating's global rank and percentile take O(log n) in the width of the
+    # rating range, however many users there are. Users with the same rating
+    # share a rank. The range grows when a rating falls outside it.
+
+    def __init__(self, low=0, high=3000):
+        self._low = low
+        self._counts = [0] * (high - low + 1)
+        self._tree = [0] * (high - low + 2)
+        self.total = 0
+
+    def load(self, counts):
+        # counts: (rating, number of users) pairs, e.g. from GROUP BY rating
+        counts = [(rating, count) for rating, count in counts if rating is not None]
+        low = min([self._low] + [rating for rating, _ in counts])
+        high = max([self._high] + [rating for rating, _ in counts])
+        self._low = low
+        self._counts = [0] * (high - low + 1)
+        for rating, count in counts:
+            self._counts[rating - low] += count
+        self._build()
+
+    @property
+    def _high(self):
+        return self._low + len(self._counts) - 1
+
+    def _build(self):
+        # O(n) construction: each node passes its sum on to its parent
+        size = len(self._counts)
+        tree = [0] + self._counts
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self.total = sum(self._counts)
+
+    def _grow(self, rating):
+        width = len(self._counts)
+        if rating < self._low:
+            extra = max(self._low - rating, width)
+            self._counts = [0] * extra + self._counts
+            self._low -= extra
+        else:
+            extra = max(rating - self._high, width)
+            self._counts = self._counts + [0] * extra
+        self._build()
+
+    def add(self, rating, count=1):
+        if not self._low <= rating <= self._high:
+            self._grow(rating)
+        self._counts[rating - self._low] += count
+        self.total += count
+        i = rating - self._low + 1
+        size = len(self._counts)
+        while i <= size:
+            self._tree[i] += count
+            i += i & -i
+
+    def move(self, old_rating, new_rating):
+        if old_rating != new_rating:
+            self.add(old_rating, -1)
+            self.add(new_rating, 1)
+
+    def count_at_most(self, rating):
+        if rating < self._low:
+            return 0
+        i = min(rating, self._high) - self._low + 1
+        count = 0
+        while i > 0:
+            count += self._tree[i]
+            i -= i & -i
+        return count
+
+    def rank(self, rating):
+        # 1 + the number of users rated strictly higher
+        return self.total - self.count_at_most(rating) + 1
+
+    def percentile(self, rating):
+        # Share of users rated strictly lower, in percent
+        if not self.total:
+            return 0.0
+        return 100 * self.count_at_most(rating - 1) / self.total
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Priority lanes, passed to bot methods as `rate_limit_args`. Lower values go first.
+# They start at 1 so that none of them is falsy, as ExtBot drops falsy
+# rate_limit_args before they reach the limiter.
+PRIORITY_HIGH = 1  # question delivery, duel results, callback answers
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3  # deletes and feedback messages
+
+ENDPOINT_PRIORITIES = {
+    'answerCallbackQuery': PRIORITY_HIGH,
+    'deleteMessage': PRIORITY_LOW,
+}
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        # Seconds until a token is available (0 if one is available now)
+        self.refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_idle(self, now):
+        self.refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class _Waiter:
+    __slots__ = ('chat_id', 'future', 'enqueued')
+
+    def __init__(self, chat_id, future, enqueued):
+        self.chat_id = chat_id
+        self.future = future
+        self.enqueued = enqueued
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    # Throttles outgoing Bot API requests with a global token bucket and one
+    # bucket per chat, using only asyncio. Waiting requests sit in priority
+    # lanes; a single dispatcher task grants tokens to the highest-priority
+    # request whose chat isn't throttled.
+    #
+    # A RetryAfter blocks the affected chat (or everything, for requests
+    # without a chat) for the advertised time and halves the global rate,
+    # which then recovers additively with every successful request.
+
+    def __init__(self, overall_rate=30, overall_burst=30, chat_rate=1, chat_burst=5, max_retries=3):
+        now = time.monotonic()
+        self._overall_rate = overall_rate
+        self._overall = TokenBucket(overall_rate, overall_burst, now)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats = {}
+        self._max_retries = max_retries
+        self._lanes = (deque(), deque(), deque())
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+        self._grants = 0
+
+        # Metrics
+        self.requests = 0
+        self.retry_afters = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self):
+        return sum(len(lane) for lane in self._lanes)
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'lane_depths': tuple(len(lane) for lane in self._lanes),
+            'requests': self.requests,
+            'retry_afters': self.retry_afters,
+            'average_wait': self.total_wait / self.requests if self.requests else 0.0,
+            'max_wait': self.max_wait,
+            'overall_rate': self._overall.rate,
+        }
+
+    async def initialize(self):
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for lane in self._lanes:
+            while lane:
+                lane.popleft().future.cancel()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = rate_limit_args if rate_limit_args in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW) else ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_NORMAL)
+        chat_id = data.get('chat_id')
+        for attempt in range(self._max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self._max_retries:
+                    raise
+                self._back_off(chat_id, e.retry_after)
+                continue
+            self._recover()
+            return result
+
+    async def _acquire(self, chat_id, priority):
+        now = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[priority - PRIORITY_HIGH].append(_Waiter(chat_id, future, now))
+        self._wakeup.set()
+        waited = await future
+        self.requests += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst, now)
+        return bucket
+
+    def _back_off(self, chat_id, retry_after):
+        self.retry_afters += 1
+        until = time.monotonic() + retry_after
+        if chat_id is None:
+            self._overall.blocked_until = max(self._overall.blocked_until, until)
+        else:
+            bucket = self._chat_bucket(chat_id, time.monotonic())
+            bucket.blocked_until = max(bucket.blocked_until, until)
+        self._overall.rate = max(self._overall.rate / 2, 1)
+        logging.warning(f'Flood control hit for chat {chat_id}, backing off {retry_after}s; overall rate now {self._overall.rate:.1f}/s')
+
+    def _recover(self):
+        if self._overall.rate < self._overall_rate:
+            self._overall.rate = min(self._overall_rate, self._overall.rate + 0.1)
+
+    async def _dispatch(self):
+        while True:
+            delay = self._release()
+            self._wakeup.clear()
+            # A loop timer rather than wait_for(), which before Python 3.12 loses
+            # a cancellation arriving as the wait completes, hanging shutdown()
+            timer = asyncio.get_running_loop().call_later(delay, self._wakeup.set) if delay is not None else None
+            try:
+                await self._wakeup.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    def _release(self):
+        # Grants as many waiting requests as the buckets allow, highest
+        # priority first. Returns the seconds until another one could go, or
+        # None when nothing is waiting.
+        now = time.monotonic()
+        next_delay = None
+        for lane in self._lanes:
+            index = 0
+            while index < len(lane):
+                overall_delay = self._overall.delay(now)
+                if overall_delay > 0:
+                    return overall_delay
+                waiter = lane[index]
+                if waiter.future.done():
+                    del lane[index]
+                    continue
+                bucket = self._chat_bucket(waiter.chat_id, now) if waiter.chat_id is not None else None
+                chat_delay = bucket.delay(now) if bucket is not None else 0.0
+                if chat_delay > 0:
+                    next_delay = chat_delay if next_delay is None else min(next_delay, chat_delay)
+                    index += 1
+                    continue
+                self._overall.tokens -= 1
+                if bucket is not None:
+                    bucket.tokens -= 1
+                del lane[index]
+                waiter.future.set_result(now - waiter.enqueued)
+                self._grants += 1
+
+        if self._grants >= 1000:
+            # Buckets that have refilled completely carry no state worth keeping
+            self._grants = 0
+            self._chats = {chat_id: bucket for chat_id, bucket in self._chats.items() if not bucket.is_idle(now)}
+        return next_delay
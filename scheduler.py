@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+
+class TimerHandle:
+    __slots__ = ('when', 'callback', 'args', 'cancelled', '_scheduler')
+
+    def __init__(self, when, callback, args, scheduler):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    def cancel(self):
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self.callback = None
+        self.args = None
+        if self._scheduler is not None:
+            self._scheduler._handle_cancelled()
+            self._scheduler = None
+
+
+class PeriodicHandle:
+    __slots__ = ('handle', 'cancelled')
+
+    def __init__(self):
+        self.handle = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self.handle is not None:
+            self.handle.cancel()
+
+
+class Scheduler:
+    # Central delayed-task scheduler. Pending callbacks live in a single heap
+    # drained by one background task, so a waiting callback costs a heap entry
+    # rather than a sleeping task. Coroutine callbacks are spawned as tasks so
+    # a slow one never holds up the timers behind it.
+    #
+    # Cancelled handles are dropped lazily; once they make up most of the heap
+    # it is compacted, so timeouts that are nearly always cancelled (answer
+    # deadlines) don't pile up.
+
+    def __init__(self):
+        self._heap = []
+        self._cancelled = 0
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner = None
+        self._tasks = set()
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Detach the dropped handles, so cancelling one later doesn't count it
+        for _, _, handle in self._heap:
+            handle._scheduler = None
+        self._heap.clear()
+        self._cancelled = 0
+
+    def call_later(self, delay, callback, *args):
+        handle = TimerHandle(time.monotonic() + max(delay, 0), callback, args, self)
+        heapq.heappush(self._heap, (handle.when, next(self._sequence), handle))
+        if self._heap[0][2] is handle:
+            self._wakeup.set()
+        return handle
+
+    def call_every(self, interval, callback, *args):
+        # Runs `callback` every `interval` seconds until the handle is cancelled
+        periodic = PeriodicHandle()
+
+        def fire():
+            periodic.handle = self.call_later(interval, fire)
+            return callback(*args)
+
+        periodic.handle = self.call_later(interval, fire)
+        return periodic
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, handle = heapq.heappop(self._heap)
+                if handle.cancelled:
+                    self._cancelled -= 1
+                else:
+                    handle._scheduler = None
+                    self._dispatch(handle)
+
+            self._wakeup.clear()
+            # A loop timer rather than wait_for(), which before Python 3.12 loses
+            # a cancellation arriving as the wait completes, hanging stop()
+            timer = asyncio.get_running_loop().call_later(self._heap[0][0] - now, self._wakeup.set) if self._heap else None
+            try:
+                await self._wakeup.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    def _handle_cancelled(self):
+        self._cancelled += 1
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def _dispatch(self, handle):
+        try:
+            result = handle.callback(*handle.args)
+        except Exception:
+            logging.exception('Scheduled callback %r failed', handle.callback)
+            return
+        if asyncio.iscoroutine(result):
+            task = asyncio.get_running_loop().create_task(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error('Scheduled task failed', exc_info=task.exception())
@@ -0,0 +1,128 @@
+import io
+import json
+
+import pytest
+
+import import_questions
+from import_questions import InvalidQuestion, iter_csv, iter_json_array, sync_file, validate
+from questions import QuestionStore
+
+CHUNK_SIZES = (1, 2, 3, 7, 1 << 16)
+
+
+def question(n, **fields):
+    return {'question': f'Question {n}?', 'options': ['yes', 'no'], 'answer': 'yes', **fields}
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('document', [
+    '[]',
+    ' \n [ ] \n',
+    '[1, 22, 333, -4.5e3, true, null]',
+    '["a,b", "]", "[", "\\"quoted\\""]',
+    '[{"nested": [1, {"deep": []}]}, [], {}]',
+    json.dumps([question(n) for n in range(20)], indent=2),
+])
+def test_json_array_matches_json_loads(document, chunk_size):
+    # Elements, numbers and strings cut at any chunk boundary decode the same
+    assert list(iter_json_array(io.StringIO(document), chunk_size)) == json.loads(document)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('document', ['', '   ', '{"question": "x"}', '1', ', [1]', '[1, 2', '[{"a": 1}'])
+def test_json_array_rejects_anything_but_a_complete_array(document, chunk_size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(document), chunk_size))
+
+
+def test_json_array_reads_one_chunk_past_the_current_element():
+    class CountingFile(io.StringIO):
+        reads = 0
+
+        def read(self, size=-1):
+            self.reads += 1
+            return super().read(size)
+
+    file = CountingFile(json.dumps([question(n) for n in range(1000)]))
+    elements = iter_json_array(file, chunk_size=256)
+    next(elements)
+    assert file.reads == 1
+
+
+def test_validate_returns_a_row():
+    row = validate(question(1, category='science', difficulty='2', language='en'))
+    assert row[:6] == ('Question 1?', '["yes", "no"]', 'yes', 'science', 2, 'en')
+
+
+@pytest.mark.parametrize('record', [
+    'not an object',
+    question(1, question=''),
+    question(1, options=['only one'], answer='only one'),
+    question(1, options=['same', 'same'], answer='same'),
+    question(1, options=['yes', 3]),
+    question(1, answer='maybe'),
+    question(1, difficulty='hard'),
+    question(1, category=['x']),
+    question(1, language=5),
+    question(1, question='x' * (import_questions.MAX_QUESTION_LENGTH + 1)),
+])
+def test_validate_rejects(record):
+    with pytest.raises(InvalidQuestion):
+        validate(record)
+
+
+def test_csv_numbered_option_columns_are_ordered_by_number():
+    file = io.StringIO('question,option2,option10,option1,answer\nQ?,b,c,a,a\n')
+    assert [record['options'] for record in iter_csv(file)] == [['a', 'b', 'c']]
+
+
+def test_csv_options_column():
+    file = io.StringIO('question,options,answer\nQ?,a|b,a\nR?,"[""x"", ""y""]",y\n')
+    assert [record['options'] for record in iter_csv(file)] == [['a', 'b'], ['x', 'y']]
+
+
+@pytest.mark.parametrize('header', ['option_a', 'optionX', 'option'])
+def test_csv_unknown_option_column_is_a_format_error(header):
+    file = io.StringIO(f'question,{header},answer\nQ?,a,a\n')
+    with pytest.raises(ValueError, match=header):
+        list(iter_csv(file))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuestionStore(str(tmp_path / 'questions.db'))
+    store.init_schema()
+    yield store
+    store.close()
+
+
+def write_json(tmp_path, records):
+    path = tmp_path / 'questions.json'
+    path.write_text(json.dumps(records) if not isinstance(records, str) else records)
+    return str(path)
+
+
+def test_sync_keeps_ids_of_unchanged_questions(store, tmp_path):
+    path = write_json(tmp_path, [question(n) for n in range(5)])
+    sync_file(store, path)
+    ids = dict(store._conn.execute('SELECT question, question_id FROM questions'))
+
+    stats = sync_file(store, write_json(tmp_path, [question(n) for n in range(1, 7)]))
+    after = dict(store._conn.execute('SELECT question, question_id FROM questions'))
+    assert (stats['inserted'], stats['deleted_ids']) == (2, [ids['Question 0?']])
+    assert all(after[text] == question_id for text, question_id in ids.items() if text != 'Question 0?')
+
+
+@pytest.mark.parametrize('content', ['', '{"question": "x"}', '[]', '[{"question": 1}]'])
+def test_sync_refuses_files_that_would_empty_the_bank(store, tmp_path, content):
+    sync_file(store, write_json(tmp_path, [question(n) for n in range(5)]))
+    with pytest.raises(ValueError):
+        sync_file(store, write_json(tmp_path, content))
+    assert store.bounds()[1] == 5
+
+
+def test_sync_refuses_to_leave_fewer_questions_than_a_duel_needs(store, tmp_path):
+    sync_file(store, write_json(tmp_path, [question(n) for n in range(5)]))
+    with pytest.raises(ValueError):
+        sync_file(store, write_json(tmp_path, [question(0), question(1)]))
+    assert store.bounds()[1] == 5
@@ -0,0 +1,66 @@
+import random
+
+from rank_index import RatingRankIndex
+
+
+def brute_rank(ratings, rating):
+    return 1 + sum(1 for other in ratings if other > rating)
+
+
+def brute_percentile(ratings, rating):
+    return 100 * sum(1 for other in ratings if other < rating) / len(ratings) if ratings else 0.0
+
+
+def check(index, ratings, probes):
+    assert index.total == len(ratings)
+    for rating in probes:
+        assert index.rank(rating) == brute_rank(ratings, rating)
+        assert index.percentile(rating) == brute_percentile(ratings, rating)
+
+
+def test_load_matches_a_brute_force_count():
+    rng = random.Random(1)
+    ratings = [rng.randint(800, 1400) for _ in range(500)]
+    counts = {}
+    for rating in ratings:
+        counts[rating] = counts.get(rating, 0) + 1
+
+    index = RatingRankIndex()
+    index.load(list(counts.items()) + [(None, 3)])  # NULL ratings are ignored
+    check(index, ratings, range(790, 1411, 7))
+
+
+def test_moves_keep_ranks_exact():
+    rng = random.Random(2)
+    ratings = [1000] * 50
+    index = RatingRankIndex()
+    index.load([(1000, 50)])
+    for _ in range(2000):
+        user = rng.randrange(len(ratings))
+        new_rating = ratings[user] + rng.choice((-10, 10))
+        index.move(ratings[user], new_rating)
+        ratings[user] = new_rating
+    check(index, ratings, sorted(set(ratings)) + [min(ratings) - 1, max(ratings) + 1])
+
+
+def test_range_grows_in_both_directions():
+    index = RatingRankIndex(low=900, high=1100)
+    ratings = [1000, -50, 5000, 1100, 900]
+    for rating in ratings:
+        index.add(rating)
+    check(index, ratings, [-100, -50, 0, 899, 900, 1000, 1100, 4999, 5000, 6000])
+
+
+def test_equal_ratings_share_a_rank():
+    index = RatingRankIndex()
+    for rating in (1200, 1100, 1100, 1000):
+        index.add(rating)
+    assert [index.rank(rating) for rating in (1200, 1100, 1000)] == [1, 2, 4]
+    assert index.percentile(1100) == 25.0
+
+
+def test_empty_index():
+    index = RatingRankIndex()
+    assert index.total == 0
+    assert index.rank(1000) == 1
+    assert index.percentile(1000) == 0.0
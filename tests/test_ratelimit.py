@@ -0,0 +1,142 @@
+import asyncio
+
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+from telegram.request import BaseRequest
+
+from ratelimit import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, PriorityRateLimiter
+
+BOT_USER = b'{"ok":true,"result":{"id":1,"is_bot":true,"first_name":"bot","username":"bot"}}'
+MESSAGE = b'{"ok":true,"result":{"message_id":1,"date":0,"chat":{"id":5,"type":"private"}}}'
+
+
+class FakeRequest(BaseRequest):
+    # Answers every Bot API call locally
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        return 200, BOT_USER if url.endswith('getMe') else MESSAGE
+
+
+class RecordingLimiter(PriorityRateLimiter):
+    # Records the lane of every request it admits
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.priorities = []
+
+    async def _acquire(self, chat_id, priority):
+        self.priorities.append(priority)
+        await super()._acquire(chat_id, priority)
+
+
+def test_priorities_reach_the_limiter_through_extbot():
+    async def run():
+        limiter = RecordingLimiter()
+        bot = ExtBot('1:token', request=FakeRequest(), get_updates_request=FakeRequest(), rate_limiter=limiter)
+        async with bot:
+            limiter.priorities.clear()  # getMe during initialize()
+            await bot.send_message(5, 'high', rate_limit_args=PRIORITY_HIGH)
+            await bot.send_message(5, 'default')
+            await bot.send_message(5, 'low', rate_limit_args=PRIORITY_LOW)
+            await bot.delete_message(5, 1)
+        return limiter.priorities
+
+    assert asyncio.run(run()) == [PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, PRIORITY_LOW]
+
+
+def test_waiting_requests_go_in_priority_order():
+    async def run():
+        # One token, refilled every 20ms: everything after the first request queues
+        limiter = PriorityRateLimiter(overall_rate=50, overall_burst=1, chat_rate=1000, chat_burst=1000)
+        await limiter.initialize()
+        order = []
+
+        async def call(name):
+            order.append(name)
+
+        async def request(name, priority, chat_id):
+            await limiter.process_request(call, (name,), {}, 'sendMessage', {'chat_id': chat_id}, priority)
+
+        await request('first', PRIORITY_NORMAL, 1)
+        tasks = [
+            asyncio.create_task(request('low', PRIORITY_LOW, 2)),
+            asyncio.create_task(request('normal', PRIORITY_NORMAL, 3)),
+            asyncio.create_task(request('high', PRIORITY_HIGH, 4)),
+        ]
+        await asyncio.gather(*tasks)
+        await limiter.shutdown()
+        return order
+
+    assert asyncio.run(run()) == ['first', 'high', 'normal', 'low']
+
+
+def test_a_throttled_chat_does_not_hold_up_other_chats():
+    async def run():
+        limiter = PriorityRateLimiter(overall_rate=1000, overall_burst=1000, chat_rate=1, chat_burst=1)
+        await limiter.initialize()
+        order = []
+
+        async def call(name):
+            order.append(name)
+
+        async def request(name, chat_id):
+            await limiter.process_request(call, (name,), {}, 'sendMessage', {'chat_id': chat_id}, PRIORITY_HIGH)
+
+        await request('a1', 1)
+        waiting = asyncio.create_task(request('a2', 1))
+        await request('b1', 2)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await limiter.shutdown()
+        return order
+
+    assert asyncio.run(run()) == ['a1', 'b1']
+
+
+def test_retry_after_retries_and_halves_the_rate():
+    async def run():
+        limiter = PriorityRateLimiter(overall_rate=30)
+        await limiter.initialize()
+        attempts = []
+
+        async def call():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise RetryAfter(0)
+            return 'sent'
+
+        result = await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': 1}, None)
+        await limiter.shutdown()
+        return result, len(attempts), limiter.retry_afters, limiter.stats()['overall_rate']
+
+    result, attempts, retry_afters, rate = asyncio.run(run())
+    assert (result, attempts, retry_afters) == ('sent', 2, 1)
+    # Halved to 15, then one successful request's additive recovery
+    assert rate == 15.1
+
+
+def test_retries_give_up_after_max_retries():
+    async def run():
+        limiter = PriorityRateLimiter(max_retries=2)
+        await limiter.initialize()
+
+        async def call():
+            raise RetryAfter(0)
+
+        try:
+            await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': 1}, None)
+        finally:
+            await limiter.shutdown()
+
+    try:
+        asyncio.run(run())
+    except RetryAfter:
+        pass
+    else:
+        raise AssertionError('RetryAfter was swallowed')
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+
+import write_batcher
+from database import Database
+from scheduler import Scheduler
+from write_batcher import WriteBatcher
+
+SCHEMA = 'CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, rating INTEGER DEFAULT 1000, first_name TEXT)'
+
+
+def run(test, tmp_path, window=60):
+    # Runs test(db, batcher) against a fresh database; the long window keeps
+    # the timer out of the way unless a test asks for it
+    async def main():
+        db = Database(str(tmp_path / 'users.db'), journal_mode='wal')
+        await db.execute(SCHEMA)
+        scheduler = Scheduler()
+        scheduler.start()
+        batcher = WriteBatcher(db, scheduler, window=window)
+        try:
+            return await test(db, batcher)
+        finally:
+            await scheduler.stop()
+            db.close()
+
+    return asyncio.run(main())
+
+
+async def users(db):
+    return await db.fetchall('SELECT user_id, username, rating FROM users ORDER BY user_id')
+
+
+def block_writer(db):
+    # Holds the writer thread until the returned event is set
+    release = threading.Event()
+    db.submit_write(lambda conn: release.wait(5))
+    return release
+
+
+def test_changes_are_merged_into_one_commit(tmp_path):
+    async def test(db, batcher):
+        batcher.register(1, 'alice', 'Alice')
+        batcher.register(2, 'bob', 'Bob')
+        for delta in (10, -10, 10):
+            batcher.add_rating(1, delta)
+        batcher.update_profile(2, 'bobby', 'Bob')
+        await batcher.flush()
+        return await users(db), batcher.commits, batcher.merged, len(batcher)
+
+    rows, commits, merged, pending = run(test, tmp_path)
+    assert rows == [(1, 'alice', 1010), (2, 'bobby', 1000)]
+    assert (commits, merged, pending) == (1, 2, 0)
+
+
+def test_timer_flushes_after_the_window(tmp_path):
+    async def test(db, batcher):
+        batcher.register(1, 'alice', 'Alice')
+        await asyncio.sleep(0.2)
+        return await users(db), batcher.commits
+
+    assert run(test, tmp_path, window=0.02) == ([(1, 'alice', 1000)], 1)
+
+
+def test_in_flight_changes_stay_visible_until_committed(tmp_path):
+    async def test(db, batcher):
+        release = block_writer(db)
+        batcher.register(1, 'alice', 'Alice')
+        batcher.add_rating(1, 10)
+        flush = asyncio.create_task(batcher.flush())
+        await asyncio.sleep(0.05)
+        during = (len(batcher), batcher.is_registering(1), batcher.pending_rating(1))
+        release.set()
+        await flush
+        after = (batcher.is_registering(1), batcher.pending_rating(1))
+        return during, after, await users(db)
+
+    during, after, rows = run(test, tmp_path)
+    assert during == (0, True, 10)
+    assert after == (False, 0)
+    assert rows == [(1, 'alice', 1010)]
+
+
+def test_pending_rating_skips_batches_a_snapshot_saw(tmp_path):
+    async def test(db, batcher):
+        batcher.register(1, 'alice', 'Alice')
+        await batcher.flush()
+        release = block_writer(db)
+        batcher.add_rating(1, 10)
+        flush = asyncio.create_task(batcher.flush())
+        await asyncio.sleep(0.05)
+        rating, seen_seq = await db.read_snapshot(fetch_rating, 1)
+        before = (rating, batcher.pending_rating(1, seen_seq), batcher.committed_seq <= seen_seq)
+        release.set()
+        await flush
+        # Once the batcher settles the batch, that snapshot is no longer current
+        stale = batcher.committed_seq <= seen_seq
+        rating, seen_seq = await db.read_snapshot(fetch_rating, 1)
+        batcher.add_rating(1, 5)
+        after = (rating, batcher.pending_rating(1, seen_seq), batcher.committed_seq <= seen_seq)
+        return before, stale, after
+
+    # Before the commit the delta is pending; after it, it is in the row only
+    assert run(test, tmp_path) == ((1000, 10, True), False, (1010, 5, True))
+
+
+def fetch_rating(conn, user_id):
+    return conn.execute('SELECT rating FROM users WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+
+def test_failed_write_is_put_back_under_newer_changes(tmp_path, monkeypatch):
+    async def test(db, batcher):
+        real_apply = write_batcher._apply
+
+        def failing_apply(conn, *batch):
+            raise RuntimeError('disk full')
+
+        monkeypatch.setattr(write_batcher, '_apply', failing_apply)
+        batcher.register(1, 'alice', 'Alice')
+        batcher.add_rating(1, 10)
+        await batcher.flush()
+        failed = (batcher.failed_flushes, batcher.commits, batcher.is_registering(1), batcher.pending_rating(1))
+
+        # Changes made after the failure are merged with the batch that came back
+        batcher.add_rating(1, 5)
+        batcher.update_profile(1, 'alicia', 'Alice')
+        monkeypatch.setattr(write_batcher, '_apply', real_apply)
+        await batcher.flush()
+        return failed, await users(db), batcher.commits
+
+    failed, rows, commits = run(test, tmp_path)
+    assert failed == (1, 0, True, 10)
+    assert rows == [(1, 'alicia', 1015)]
+    assert commits == 1
+
+
+def test_flush_waits_for_batches_flushed_earlier(tmp_path):
+    async def test(db, batcher):
+        release = block_writer(db)
+        batcher.add_rating(1, 10)
+        earlier = asyncio.create_task(batcher.flush())
+        await asyncio.sleep(0.05)
+        waiting = asyncio.create_task(batcher.flush())
+        await asyncio.sleep(0.05)
+        blocked = waiting.done()
+        release.set()
+        await asyncio.gather(earlier, waiting)
+        return blocked, batcher.commits
+
+    assert run(test, tmp_path) == (False, 1)
+
+
+def test_cancelling_the_flush_does_not_lose_the_batch(tmp_path):
+    async def test(db, batcher):
+        batcher.register(1, 'alice', 'Alice')
+        release = block_writer(db)
+        flush = asyncio.create_task(batcher.flush())
+        await asyncio.sleep(0.05)
+        flush.cancel()
+        release.set()
+        await batcher.flush()
+        return await users(db)
+
+    assert run(test, tmp_path) == [(1, 'alice', 1000)]
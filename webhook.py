@@ -0,0 +1,207 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+MAX_BODY_SIZE = 1 << 20
+MAX_HEADER_COUNT = 100
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    414: 'URI Too Long',
+    431: 'Request Header Fields Too Large',
+}
+
+
+class BadHttpRequest(Exception):
+    pass
+
+
+async def _read_line(reader, status):
+    # A line longer than the stream's limit (64 KiB by default) is answered
+    # with `status` instead of failing the connection task
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        raise BadHttpRequest(status)
+
+
+async def read_request(reader):
+    # Reads one HTTP/1.1 request. Returns (method, path, headers, body), or None
+    # if the client closed the connection between requests. Only bodies with a
+    # Content-Length are supported, which is what Telegram sends.
+    line = await _read_line(reader, 414)
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode('latin-1').split()
+    except ValueError:
+        raise BadHttpRequest(400)
+
+    headers = {}
+    while True:
+        line = await _read_line(reader, 431)
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HEADER_COUNT:
+            raise BadHttpRequest(400)
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    headers[':version'] = version
+
+    if 'transfer-encoding' in headers:
+        raise BadHttpRequest(400)
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise BadHttpRequest(400)
+    if length < 0:
+        raise BadHttpRequest(400)
+    if length > MAX_BODY_SIZE:
+        raise BadHttpRequest(413)
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def write_response(writer, status, body=b'', keep_alive=True, content_type='application/json'):
+    head = [f'HTTP/1.1 {status} {_REASONS.get(status, "")}', f'Content-Length: {len(body)}']
+    if body:
+        head.append(f'Content-Type: {content_type}')
+    if not keep_alive:
+        head.append('Connection: close')
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+
+def _keep_alive(headers):
+    connection = headers.get('connection', '').lower()
+    if headers[':version'] == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+class WebhookServer:
+    # Minimal HTTP listener for Telegram webhooks. Each POST to the webhook path
+    # is checked against the secret token, decoded and put straight onto the
+    # application's update queue, so updates skip the getUpdates round trip.
+    # Connections are kept alive, as Telegram reuses them for later updates.
+
+    def __init__(self, application, listen, port, url_path, secret_token, idle_timeout=60):
+        self._application = application
+        self._listen = listen
+        self._port = port
+        self._url_path = '/' + url_path.lstrip('/')
+        self._secret_token = secret_token.encode()
+        self._idle_timeout = idle_timeout
+        self._server = None
+        self._connections = {}  # connection task -> its StreamWriter
+
+        # Metrics
+        self.updates = 0
+        self.rejected = 0
+
+    @property
+    def port(self):
+        # The bound port, which differs from the configured one if that was 0
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self._listen, self._port)
+        logging.info(f'Webhook listening on {self._listen}:{self.port}{self._url_path}')
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        # Closing the transports ends the connection loops at their next read
+        tasks = list(self._connections)
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), self._idle_timeout)
+                except BadHttpRequest as e:
+                    self.rejected += 1
+                    write_response(writer, e.args[0], keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status = self._handle(method, path, headers, body)
+                keep_alive = _keep_alive(headers)
+                write_response(writer, status, keep_alive=keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    def _handle(self, method, path, headers, body):
+        if path != self._url_path:
+            self.rejected += 1
+            return 404
+        if method != 'POST':
+            self.rejected += 1
+            return 405
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, '').encode(), self._secret_token):
+            self.rejected += 1
+            logging.warning('Webhook request with a wrong secret token')
+            return 403
+        try:
+            update = Update.de_json(json.loads(body), self._application.bot)
+        except Exception as e:
+            self.rejected += 1
+            logging.warning(f'Invalid update received on the webhook: {e}')
+            return 400
+        self._application.update_queue.put_nowait(update)
+        self.updates += 1
+        return 200
+
+
+async def _run(application, server, webhook_url, secret_token, stop_signals):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in stop_signals:
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await server.start()
+        await application.bot.set_webhook(url=webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+        await application.start()
+        await stop.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application, server, webhook_url, secret_token, stop_signals=(signal.SIGINT, signal.SIGTERM)):
+    # Counterpart of Application.run_polling() for WebhookServer: sets up the
+    # application, registers the webhook and runs until a stop signal arrives
+    asyncio.run(_run(application, server, webhook_url, secret_token, stop_signals))
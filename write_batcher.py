@@ -0,0 +1,122 @@
+import asyncio
+import logging
+
+
+class WriteBatcher:
+    # Write-behind buffer for the users table. Registrations, profile changes
+    # and rating deltas are collected in memory and written in one transaction
+    # when the first of them is `window` seconds old or `max_ops` have piled up.
+    # Repeated changes for the same user are merged, so the number of commits
+    # no longer follows the number of duels. At most one window of changes is
+    # lost if the process dies; flush() must be awaited on shutdown.
+
+    def __init__(self, db, scheduler, window=0.25, max_ops=500):
+        self._db = db
+        self._scheduler = scheduler
+        self._window = window
+        self._max_ops = max_ops
+        self._registrations = {}  # user_id -> (username, first_name)
+        self._profiles = {}  # user_id -> (username, first_name)
+        self._deltas = {}  # user_id -> rating change
+        self._in_flight = {}  # write future -> (write seq, batch) the writer hasn't finished with
+        self._ops = 0
+        self._timer = None
+        self.committed_seq = 0  # write seq of the latest batch committed
+
+        # Metrics
+        self.operations = 0
+        self.merged = 0
+        self.commits = 0
+        self.failed_flushes = 0
+
+    def __len__(self):
+        return len(self._registrations) + len(self._profiles) + len(self._deltas)
+
+    def is_registering(self, user_id):
+        # Until the registration is committed, so a user is never registered twice
+        return user_id in self._registrations or any(user_id in batch[0] for _, batch in self._in_flight.values())
+
+    def pending_rating(self, user_id, seen_seq=0):
+        # Rating change a read hasn't seen yet, for reads that must see their own
+        # writes: the pending one plus those of batches committed after `seen_seq`
+        # (see Database.read_snapshot). Batches committed since the read already
+        # left this count, so a read is only current while seen_seq >= committed_seq.
+        return self._deltas.get(user_id, 0) + sum(
+            batch[2].get(user_id, 0) for seq, batch in self._in_flight.values() if seq > seen_seq
+        )
+
+    def register(self, user_id, username, first_name):
+        self._merge(self._registrations, user_id, (username, first_name))
+
+    def update_profile(self, user_id, username, first_name):
+        self._merge(self._profiles, user_id, (username, first_name))
+
+    def add_rating(self, user_id, delta):
+        self._merge(self._deltas, user_id, self._deltas.get(user_id, 0) + delta)
+
+    def _merge(self, pending, user_id, value):
+        if user_id in pending:
+            self.merged += 1
+        pending[user_id] = value
+        self.operations += 1
+        self._ops += 1
+        if self._ops >= self._max_ops:
+            self._arm(0)
+        elif self._timer is None:
+            self._arm(self._window)
+
+    def _arm(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._scheduler.call_later(delay, self.flush)
+
+    async def flush(self):
+        # Returns once every change made so far is committed, or put back after
+        # a failed write
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if len(self):
+            batch = (self._registrations, self._profiles, self._deltas)
+            self._registrations, self._profiles, self._deltas = {}, {}, {}
+            self._ops = 0
+            # Handed to the writer before yielding, so anything queued on it after
+            # this point sees the batch. Its outcome is handled in _written, which
+            # runs even if the timer task awaiting it is cancelled.
+            write = self._db.submit_write(_apply, *batch)
+            future = asyncio.wrap_future(write)
+            self._in_flight[future] = (write.seq, batch)
+            future.add_done_callback(self._written)
+        if self._in_flight:
+            # Including batches that earlier flushes handed over
+            await asyncio.wait(list(self._in_flight))
+
+    def _written(self, future):
+        seq, (registrations, profiles, deltas) = self._in_flight.pop(future)
+        if future.exception() is None:
+            self.commits += 1
+            self.committed_seq = max(self.committed_seq, seq)
+            return
+        # Put the batch back under anything queued since, and try again later
+        self.failed_flushes += 1
+        logging.error('Failed to write a batch of user changes; retrying', exc_info=future.exception())
+        self._registrations = {**registrations, **self._registrations}
+        self._profiles = {**profiles, **self._profiles}
+        for user_id, delta in deltas.items():
+            self._deltas[user_id] = self._deltas.get(user_id, 0) + delta
+        self._arm(self._window)
+
+
+def _apply(conn, registrations, profiles, deltas):
+    conn.executemany(
+        'INSERT OR IGNORE INTO users (user_id, username, first_name) VALUES (?, ?, ?)',
+        ((user_id, username, first_name) for user_id, (username, first_name) in registrations.items()),
+    )
+    conn.executemany(
+        'UPDATE users SET username = ?, first_name = ? WHERE user_id = ?',
+        ((username, first_name, user_id) for user_id, (username, first_name) in profiles.items()),
+    )
+    conn.executemany(
+        'UPDATE users SET rating = rating + ? WHERE user_id = ?',
+        ((delta, user_id) for user_id, delta in deltas.items() if delta),
+    )